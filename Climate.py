@@ -1,293 +1,947 @@
 #!/usr/bin/env python3
 
-from bs4 import BeautifulSoup
+from darksky_parser import FIELD_TYPES, WEATHER_KEYS, HourlyColumns
+from metrics import ScrapeMetrics
 import json
-import matplotlib.pyplot as plt
 import numpy as np
+import os
 import pandas as pd
-import re
-import requests
-import seaborn as sns
-from sqlalchemy import create_engine
+from rolling_stats import RollingStats, as_datetime, years
 import sys
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+try:
+    import zstandard #optional... only used for the raw page archive, zlib otherwise
+except ImportError:
+    zstandard = None
+#matplotlib, seaborn, bs4, requests and sqlalchemy are imported inside the functions that use them, so a scrape
+#never pays for the plotting stack (and vice versa) and `import Climate` stays quick
 
-# CREATE SQL ENGINES... DATABASES IN THIS FILEPATH
-demo_engine = create_engine('sqlite:///ScrapeDemo.db',echo=False)
-engine = create_engine('sqlite:///FinalProjectGMH.db',echo=False)
+# SQL ENGINES... DATABASES IN THIS FILEPATH, CREATED ON FIRST USE (get_engine(), or Climate.engine / demo_engine)
+DB_FILES = {'demo_engine':'ScrapeDemo.db', 'engine':'FinalProjectGMH.db'}
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _sqlite_pragmas(dbapi_con, con_record):
+    '''the scrape db gets written a block at a time while we read it... WAL lets those happen side by side'''
+    cursor = dbapi_con.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+def _sqlite_autocommit(dbapi_con, con_record):
+    '''
+    stop pysqlite from managing transactions itself: left alone it only issues BEGIN before INSERT/UPDATE/DELETE,
+    so a DROP / CREATE / ALTER at the start of an engine.begin() block gets committed on the spot
+    '''
+    dbapi_con.isolation_level = None
+
+def _sqlite_begin(conn):
+    '''...and issue a real BEGIN instead, so everything in a begin() block (DDL too) commits or rolls back together'''
+    conn.exec_driver_sql('BEGIN')
+
+def get_engine(name='demo_engine'):
+    '''
+    the sqlalchemy engine for ScrapeDemo.db ('demo_engine', the default) or FinalProjectGMH.db ('engine'),
+    created the first time it's asked for. Transactions on either are real sqlite transactions (DDL included).
+    '''
+    with _engines_lock:
+        if name not in _engines:
+            from sqlalchemy import create_engine, event
+            _engines[name] = create_engine(f'sqlite:///{DB_FILES[name]}', echo=False)
+            event.listen(_engines[name], 'connect', _sqlite_autocommit)
+            event.listen(_engines[name], 'begin', _sqlite_begin)
+            if name == 'demo_engine':
+                event.listen(_engines[name], 'connect', _sqlite_pragmas)
+        return _engines[name]
+
+def __getattr__(name):
+    '''Climate.engine and Climate.demo_engine still work from outside... they're just made on first access'''
+    if name in DB_FILES:
+        return get_engine(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 #__________________________________________________________________________________________________________________
-def coordinates(location):
+OPENCAGE_URL = 'https://api.opencagedata.com/geocode/v1/json'
+OPENCAGE_KEY = '4ffeb0c77c5c4d9a8962be54e9d6c010'
+
+def _geocode_key(loc):
+    '''normalized cache key for a place name: 'los  Angeles ' and 'Los Angeles' are the same place'''
+    return ' '.join(loc.lower().split())
+
+def _init_geocode_cache(con):
+    con.exec_driver_sql('''CREATE TABLE IF NOT EXISTS geocode_cache (
+                               key TEXT PRIMARY KEY,
+                               query TEXT NOT NULL,
+                               latlon TEXT NOT NULL,
+                               fetched REAL NOT NULL)''')
+
+def _geocode(loc, base_url=OPENCAGE_URL):
+    '''one opencage lookup -> 'lat,lon' string (4 decimals), or None'''
+    import requests
+    encoded_loc = requests.utils.quote(loc)
+    url = f'{base_url}?q={encoded_loc}&key={OPENCAGE_KEY}'
+    try:
+        js = requests.get(url, timeout=30).json()
+        major_loc = js.get('results')[0] #likely to return many cities with the name. biggest is top of list.
+        lat, lon = major_loc['geometry']['lat'], major_loc['geometry']['lng']
+    except Exception:
+        print(f"could not get url for '{loc}'")
+        return None
+    return f'{lat:.4f},{lon:.4f}'
+
+def coordinates(location, ttl_days=90, max_entries=10000, refresh=False, base_url=OPENCAGE_URL, max_workers=4):
     '''
     Uses the opencagedata geocoding API to return latitude and longitude for an input city name.
 
     Input: list of city name(s) as string(s). Defaults to Anchorage and Auckland (since I've already scraped LA
     and Manila. The idea is to get a few locations around the perimeter of the Pacific)
+
+    Answers are cached in the geocode_cache table of ScrapeDemo.db, keyed by the normalized place name, so only
+    names that aren't cached yet (or are older than ttl_days, or everything if refresh=True) hit the network,
+    and those are looked up concurrently (max_workers at a time). Expired entries are evicted on every call, as
+    are the oldest ones beyond max_entries. Failed lookups aren't cached. base_url lets you point the lookups at
+    a local stand-in for the opencage endpoint.
     '''
     if np.ndim(location) < 1: #if location entered as a string instead of a list containing a string...
         location = [location]
 
-    my_key = '4ffeb0c77c5c4d9a8962be54e9d6c010'
-    base_url = 'https://api.opencagedata.com/geocode/v1/json'
+    now = time.time()
+    with get_engine().begin() as conn:
+        _init_geocode_cache(conn)
+        conn.exec_driver_sql('DELETE FROM geocode_cache WHERE fetched < ?', (now - ttl_days*86400,))
+        cached = {} if refresh else dict(conn.exec_driver_sql('SELECT key, latlon FROM geocode_cache').fetchall())
+
+    misses = {} #normalized key -> first spelling asked for, so 'LA' and 'la' are one lookup
+    for loc in location:
+        if _geocode_key(loc) not in cached:
+            misses.setdefault(_geocode_key(loc), loc)
+    if misses:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            found = dict(zip(misses, pool.map(lambda loc: _geocode(loc, base_url), misses.values())))
+        rows = [(key, misses[key], latlon, now) for key, latlon in found.items() if latlon]
+        with get_engine().begin() as conn:
+            if rows:
+                conn.exec_driver_sql('''INSERT OR REPLACE INTO geocode_cache (key, query, latlon, fetched)
+                                        VALUES (?, ?, ?, ?)''', rows)
+            conn.exec_driver_sql('''DELETE FROM geocode_cache WHERE key NOT IN
+                                    (SELECT key FROM geocode_cache ORDER BY fetched DESC LIMIT ?)''', (max_entries,))
+        cached.update(found)
 
     latlon = {}
     for loc in location:
-        encoded_loc = requests.utils.quote(loc)
-        url = f'{base_url}?q={encoded_loc}&key={my_key}'
-        try:
-            js = requests.get(url).json()
-            major_loc = js.get('results')[0] #likely to return many cities with the name. biggest is top of list.
-            lat, lon = major_loc['geometry']['lat'], major_loc['geometry']['lng']
-        except:
-            print(f"could not get url for '{loc}'")
-            lat, lon = None, None
-
-        if lat:
-            latlon[loc] = f'{lat:.4f},{lon:.4f}'
-        else:
-            latlon[loc] = None
+        latlon[loc] = cached.get(_geocode_key(loc))
+        if latlon[loc] is None:
             print('invalid location entered')
     return latlon
 
 #_________________________________________________________________________________________________________________
-def weather_data(location={'USC':'34.0224,-118.2851'}, start='1950-01-01', end='2022-01-01'):
-    '''
-    WARNING: RUNNING THIS FUNCTION WITH DEFAULT start & end ARGUMENTS WILL TAKE 6+ HOURS TO COMPLETE.
-    IT SCRAPES A darksky.net URL FOR EVERY SINGLE DAY FROM '1950-01-01' TO '2022-01-01' AT THE LOCATION SPECIFIED.
-    EACH DAY IS COMPRISED OF 24 OBSERVATIONS (ON THE HOUR) OF 24 DIFFERENT WEATHER PARAMETERS.
-    IT CREATES A DICTIONARY WITH 72 * 365 + LEAP DAYS = 26,299 ENTRIES, I.E., 1 DICT ENTRY PER DAY.
-    EACH DICT ENTRY IS THE RAW TEXT SCRAPED FROM THE URL FOR THAT DAY/LOCATION, CONTAINING 24 HR x 24 PARAMS = 576
-    ELEMENTS. SO THAT'S 576 * 26,299 = 15,148,224 DATA ELEMENTS TOTAL.
-
-    IT THEN WRANGLES THE DATA FROM THIS DICTIONARY INTO A DICTIONARY OF DATA FRAMES, WHICH ARE THEN APPENDED TO
-    ONE ANOTHER TO PRODUCE A SINGLE, COMPLETE DATAFRAME (THIS PART TAKES ROUGHLY HALF OF THE 6+ COMPLETION HOURS).
-    THIS DATAFRAME IS THEN STORED AS A SQL TABLE WHICH CAN BE QUERRIED AS NEEDED.
-
-    IF YOU DON'T WANT YOUR COMPUTER TIED UP FOR 6+ HOURS, YOU'RE PROBABLY BETTER OFF JUST QUERYING THIS
-    DATA FROM THE SQL DATABASE 'FinalProjectGMH.db' PROVIDED IN THE ZIPPED FOLDER. I'LL PROBABLY JUST HAVE THE
-    SCRIPT DO SUCH A QUERY AUTOMATICALLY INSTEAD OF CALLING THIS weather_data() FUNCTION. TO SHOW THAT THIS FUNCTION
-    ACTUALLY DOES WHAT IT SAYS IT DOES, I'LL HAVE THE SCRIPT CALL IT, BUT FOR AN EXTREMELY TRUNCATED DATE RANGE.
-    IT WILL SAVE THE DATA TO AN ENTIRELY DIFFERENT ScrapeDemo.db SQL DATABASE, SO AS NOT TO INTERFERE WITH THE OTHER
-    ANALYSIS TASKS THAT PULL FROM THE TRUE (AND MUCH LARGER) FinalProjectGMH.db DATABASE.
-
-    THERE'S CERTAINLY ROOM FOR IMPROVEMENT HERE > I PROBABLY SHOULD HAVE USED SOME KIND OF BATCH PROCESSING FOR THIS
-    SINCE IT'S OBVIOUSLY NOT SUPER ROBUST AND IT'D BE NICE TO AT LEAST RETAIN WHAT'S BEEN SCRAPED SO FAR IN THE
-    EVENT IT FAILS OUT. FRANKLY, I WAS PRETTY SHOCKED IT ACTUALLY WORKED THE FIRST TIME I RAN IT FOR THE WHOLE
-    72-YEAR DATE RANGE (USC CAMPUS LOCATION), AT WHICH POINT I HADN'T EVEN PROVIDED ANY TRY/EXCEPT BLOCKS TO CATCH
-    BAD URLs. THE SECOND TIME I TRIED IT (MANILA), I LET IT RUN FOR 12+ HOURS BEFORE FINALLY INTERRUPTING IT. I
-    STILL DON'T KNOW WHAT THE ISSUE WAS - SEEMS LIKE PERHAPS SOME KIND OF INFINTE LOOP(?) BUT IT DID RENDER USEFUL
-    DATA. THIRD ATTEMPT (DARWIN, AUSTRALIA) FAILED WITH THE DREADED "COOL YOUR JETS, BUDDY - THAT'S QUITE ENOUGH
-    SERVER HITS FOR YOU!" MESSAGE FROM Darksky.net :/ ... IT APPEARS MY IP HAS NOT BEEN OUTRIGHT BLOCKED, AS I'M
-    STILL ABLE TO SCRAPE TRUNCATED DATE RANGES. I'VE YET TO TRY ANOTHER FULL RUN.
+DARKSKY_URL = 'https://darksky.net/details/{latlon}/{day}/us12/en'
+THROTTLE_MARKER = 'cool your jets' #darksky's "that's quite enough server hits for you" page
 
+class RateLimiter:
     '''
-    date_range = pd.date_range(start=start, end=end, freq='D')
-    days = [str(day)[:10] for day in date_range]#[:10] to exclude HH:MM:SS component
-    urls = []
-    for day in days:
-        url = f'https://darksky.net/details/{list(location.values())[0]}/{day}/us12/en'
-        urls.append(url)
+    Global politeness budget shared by every fetch worker (thread-safe). Hands out request slots no faster
+    than `rps` per second, no matter how many workers are waiting on it.
+
+    When darksky sends its "cool your jets" page, call throttled(): every worker's next slot gets pushed out
+    by the current penalty, which doubles on each consecutive throttle (capped at max_backoff seconds) and
+    resets to `backoff` once a request goes through cleanly (ok()).
+    '''
+    def __init__(self, rps=5.0, backoff=30.0, max_backoff=900.0):
+        self.interval = 1.0/rps if rps else 0.0
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._penalty = backoff
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def throttled(self):
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + self._penalty)
+            self._penalty = min(self._penalty*2, self.max_backoff)
+
+    def ok(self):
+        with self._lock:
+            self._penalty = self.backoff
 
-    raw_days = dict.fromkeys(days) #let's first just collect the raw text from each URL in here...
-    for day, url in list(zip(days,urls)):
+def make_session(pool_size=8):
+    '''requests.Session with a keep-alive connection pool big enough for pool_size concurrent workers'''
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_page(url, session, limiter, retries=5, timeout=30, metrics=None):
+    '''
+    GET one darksky details page and return the text of its second <script> tag (where all the hourly data
+    lives), or None if the page doesn't have one. Throttle pages / HTTP 429 / connection errors back off
+    through the shared limiter and get retried up to `retries` times. Latency, bytes, retries and throttles
+    are reported to `metrics` (a metrics.ScrapeMetrics) if given.
+    '''
+    if metrics:
+        with metrics.profiled('fetch'): #this runs on a worker thread... the fetch stage's profiler can't see it
+            return _fetch_page(url, session, limiter, retries, timeout, metrics)
+    return _fetch_page(url, session, limiter, retries, timeout, metrics)
+
+def _fetch_page(url, session, limiter, retries, timeout, metrics):
+    import requests
+    from bs4 import BeautifulSoup
+    for attempt in range(retries + 1):
+        if attempt and metrics:
+            metrics.count('retries')
+        limiter.wait()
+        sent = time.perf_counter()
+        try:
+            page = session.get(url, timeout=timeout)
+        except requests.RequestException:
+            limiter.throttled()
+            continue
+        if metrics:
+            metrics.http(time.perf_counter() - sent, len(page.content))
+        if page.status_code == 429 or THROTTLE_MARKER in page.text.lower():
+            limiter.throttled()
+            if metrics:
+                metrics.count('throttles')
+            continue
+        limiter.ok()
+        if metrics:
+            metrics.count('fetched')
         try:
-            page = requests.get(url)
             soup = BeautifulSoup(page.content, 'html.parser')
-            dataTag = soup.findAll('script')[1] #second <script> tag contains all hourly data... the jackpot
+            return soup.findAll('script')[1].text #second <script> tag contains all hourly data... the jackpot
         except IndexError:
-            print(f'could not make dataTag for {day}')
-            dataTag = None
+            return None
+    print(f'gave up on {url} after {retries + 1} attempts')
+    return None
+
+def fetch_pages(jobs, max_workers=8, rps=5.0, limiter=None, session=None, metrics=None):
+    '''
+    Concurrent fetch engine. jobs is an iterable of (key, url) pairs; yields (key, script_text) pairs in
+    whatever order they finish. max_workers requests run at once over pooled keep-alive connections, while
+    the limiter keeps the whole lot under `rps` requests per second (pass your own RateLimiter to share one
+    budget between several calls). metrics gets fed every response and logs progress as pages come in, and
+    also every metrics.interval seconds while none do (e.g. with every worker sitting out a throttle backoff),
+    so a stalled scrape still shows up in the log.
+    '''
+    limiter = limiter or RateLimiter(rps)
+    own_session = session is None
+    session = session or make_session(max_workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(fetch_page, url, session, limiter, metrics=metrics): key for key, url in jobs}
+            pending = set(futures)
+            heartbeat = max(metrics.interval, 0.5) if metrics else None
+            while pending:
+                finished, pending = wait(pending, timeout=heartbeat, return_when=FIRST_COMPLETED)
+                if metrics:
+                    metrics.maybe_log()
+                for future in finished:
+                    yield futures[future], future.result()
+    finally:
+        if own_session:
+            session.close()
+
+#_________________________________________________________________________________________________________________
+def _init_ledger(con):
+    '''first_time / last_time: epoch range of the hours stored for that day (what reparse_archive() replaces)'''
+    con.exec_driver_sql('''CREATE TABLE IF NOT EXISTS scrape_ledger (
+                               loc TEXT NOT NULL,
+                               day TEXT NOT NULL,
+                               status TEXT NOT NULL,
+                               attempts INTEGER NOT NULL DEFAULT 0,
+                               updated TEXT,
+                               first_time INTEGER,
+                               last_time INTEGER,
+                               PRIMARY KEY (loc, day))''')
+    have = {row[1] for row in con.exec_driver_sql('PRAGMA table_info(scrape_ledger)')}
+    for col in ('first_time', 'last_time'): #ledgers from before the ranges were kept
+        if col not in have:
+            con.exec_driver_sql(f'ALTER TABLE scrape_ledger ADD COLUMN {col} INTEGER')
+
+def scrape_progress(loc, con=None):
+    '''
+    The scrape ledger for one location as a data frame (day, status, attempts, updated), e.g. to see which
+    days of a long scrape are still missing or failed.
+    '''
+    with (con or get_engine()).begin() as conn:
+        _init_ledger(conn)
+        return pd.read_sql('SELECT day, status, attempts, updated FROM scrape_ledger WHERE loc = ? ORDER BY day',
+                           con=conn, params=(loc,))
+
+#_________________________________________________________________________________________________________________
+RAW_CODEC = 'zstd' if zstandard else 'zlib'
+
+def _init_archive(con):
+    con.exec_driver_sql('''CREATE TABLE IF NOT EXISTS raw_pages (
+                               loc TEXT NOT NULL,
+                               day TEXT NOT NULL,
+                               codec TEXT NOT NULL,
+                               fetched TEXT,
+                               payload BLOB NOT NULL,
+                               PRIMARY KEY (loc, day))''')
+
+def _compress(txt, codec=RAW_CODEC):
+    raw = txt.encode('utf-8')
+    return zstandard.ZstdCompressor(level=10).compress(raw) if codec == 'zstd' else zlib.compress(raw, 9)
+
+def _decompress(payload, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ImportError('this page was archived with zstd... pip install zstandard to read it back')
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    return zlib.decompress(payload).decode('utf-8')
+
+def raw_page(loc, day):
+    '''the archived script text for one loc/day (None if it was never archived)'''
+    with get_engine().begin() as conn:
+        _init_archive(conn)
+        row = conn.exec_driver_sql('SELECT codec, payload FROM raw_pages WHERE loc = ? AND day = ?',
+                                   (loc, day)).fetchone()
+    return _decompress(row[1], row[0]) if row else None
+
+#_________________________________________________________________________________________________________________
+WEATHER_TEXT_FIELDS = [key for key in WEATHER_KEYS if FIELD_TYPES[key] is str] #summary, icon, precipType
+WEATHER_COLUMN_TYPES = {key: 'INTEGER' if FIELD_TYPES[key] in (int, str) else 'REAL' for key in WEATHER_KEYS}
+
+def _init_weather_table(conn, loc):
+    '''
+    The weather_<loc> schema: integer epoch `time` as the primary key (so it IS the table's b-tree and time
+    ranges are index lookups), REAL for the measurements, INTEGER for windBearing/uvIndex, and the three text
+    fields dictionary-encoded as ids into the shared weather_labels table. weather_<loc>_text is a view with
+    the labels joined back in.
+    '''
+    conn.exec_driver_sql('''CREATE TABLE IF NOT EXISTS weather_labels (
+                               id INTEGER PRIMARY KEY,
+                               field TEXT NOT NULL,
+                               label TEXT NOT NULL,
+                               UNIQUE (field, label))''')
+    cols = ',\n'.join(f'"{key}" {WEATHER_COLUMN_TYPES[key]}' for key in WEATHER_KEYS if key != 'time')
+    conn.exec_driver_sql(f'CREATE TABLE IF NOT EXISTS "weather_{loc}" (time INTEGER PRIMARY KEY, {cols})')
+
+    select = ', '.join(f'{field}.label AS "{field}"' if field in WEATHER_TEXT_FIELDS else f'w."{field}"'
+                       for field in WEATHER_KEYS)
+    joins = ' '.join(f'LEFT JOIN weather_labels AS {field} ON {field}.id = w."{field}"' for field in WEATHER_TEXT_FIELDS)
+    conn.exec_driver_sql(f'CREATE VIEW IF NOT EXISTS "weather_{loc}_text" AS '
+                         f'SELECT {select} FROM "weather_{loc}" AS w {joins}')
+
+def _label_ids(conn, field, labels):
+    '''{label: id} for one text field, adding any labels weather_labels hasn't seen yet'''
+    labels = [label for label in labels if label is not None]
+    if labels:
+        conn.exec_driver_sql('INSERT OR IGNORE INTO weather_labels (field, label) VALUES (?, ?)',
+                             [(field, label) for label in labels])
+    return dict(conn.exec_driver_sql('SELECT label, id FROM weather_labels WHERE field = ?', (field,)).fetchall())
+
+def _insert_weather(conn, loc, df):
+    '''
+    bulk insert hourly rows into weather_<loc> (one executemany on the caller's transaction). the text fields
+    get swapped for their label ids; rows for an hour that's already stored replace it.
+    '''
+    _init_weather_table(conn, loc)
+    df = df[WEATHER_KEYS].astype(object).where(df[WEATHER_KEYS].notna(), None)
+    for field in WEATHER_TEXT_FIELDS:
+        ids = _label_ids(conn, field, df[field].unique())
+        df[field] = df[field].map(ids.get)
+    cols = ', '.join(f'"{key}"' for key in WEATHER_KEYS)
+    marks = ', '.join('?'*len(WEATHER_KEYS))
+    conn.exec_driver_sql(f'INSERT OR REPLACE INTO "weather_{loc}" ({cols}) VALUES ({marks})',
+                         list(df.itertuples(index=False, name=None)))
+
+def _epoch(when):
+    return None if when is None else int(pd.Timestamp(when, tz='UTC').timestamp())
+
+def read_weather(loc, columns=None, start=None, end=None, con=None):
+    '''
+    Hourly weather for a location as a data frame, text fields decoded (as categoricals). columns picks the
+    weather parameters (time always comes along), start/end (anything pd.Timestamp understands, UTC, end
+    exclusive) limit the time range through the primary key, so a single decade is a quick range lookup
+    rather than a full table read. con defaults to ScrapeDemo.db. (read_table() with full-width dtypes.)
+    '''
+    columns = ['time'] + [key for key in (columns or WEATHER_KEYS) if key != 'time']
+    return read_table(f'weather_{loc}', columns, start, end, con=con or get_engine(), downcast=False, order=True)
+
+def migrate_weather_table(loc, con=None, chunksize=100000):
+    '''
+    Convert an old pandas-written weather_<loc> table (inferred types, `index` column, no key) to the typed
+    schema above, in place. Duplicate hours collapse onto the primary key. Every migrated day is marked 'done'
+    in the scrape ledger (so a resumed weather_data() carries on from the table instead of starting over) and
+    the location's rollups are rebuilt. All of that shares one transaction (get_engine()'s transactions cover
+    DDL), so if any chunk fails the old table is left exactly as it was... with some other con that doesn't
+    issue its own BEGIN that isn't guaranteed.
+    '''
+    old = f'weather_{loc}'
+    with (con or get_engine()).begin() as conn:
+        conn.exec_driver_sql(f'ALTER TABLE "{old}" RENAME TO "_{old}_old"')
+        for chunk in pd.read_sql(f'SELECT * FROM "_{old}_old"', con=conn, chunksize=chunksize):
+            chunk = chunk.reindex(columns=WEATHER_KEYS)
+            chunk['time'] = chunk['time'].astype('int64')
+            _insert_weather(conn, loc, chunk)
+        conn.exec_driver_sql(f'DROP TABLE "_{old}_old"')
+
+        _init_ledger(conn)
+        times = pd.Series([row[0] for row in conn.exec_driver_sql(f'SELECT time FROM "{old}" ORDER BY time')],
+                          dtype='int64')
+        if len(times):
+            #the old tables don't say which local day an hour was scraped under, but the first stored hour is
+            #local midnight of the first day... which pins the utc offset (taken between -11h and +13h)
+            midnight = int(times.iloc[0]) % 86400
+            utc_offset = -midnight if midnight < 11*3600 else 86400 - midnight
+            days = pd.to_datetime(times + utc_offset, unit='s').dt.strftime('%Y-%m-%d')
+            per_day = times.groupby(days.to_numpy()).agg(['count', 'min', 'max'])
+            per_day = per_day[per_day['count'] >= 12] #not the odd hour a dst change pushes past midnight
+            stamp = pd.Timestamp.now().isoformat(timespec='seconds')
+            conn.exec_driver_sql('''INSERT OR REPLACE INTO scrape_ledger
+                                        (loc, day, status, attempts, updated, first_time, last_time)
+                                    VALUES (?, ?, 'done', 1, ?, ?, ?)''',
+                                 [(loc, day, stamp, int(first), int(last))
+                                  for day, first, last in per_day[['min', 'max']].itertuples()])
+        _init_rollups(conn)
+        conn.exec_driver_sql('DELETE FROM weather_rollup WHERE loc = ?', (loc,))
+        update_rollups(conn, loc)
+
+#_________________________________________________________________________________________________________________
+ROLLUP_GRAINS = {'day':'%Y-%m-%d', 'month':'%Y-%m', 'year':'%Y'} #strftime format of each grain's period label
+ROLLUP_PARAMS = [key for key in WEATHER_KEYS if key != 'time' and FIELD_TYPES[key] is not str]
+
+def _init_rollups(conn):
+    conn.exec_driver_sql('''CREATE TABLE IF NOT EXISTS weather_rollup (
+                               loc TEXT NOT NULL,
+                               param TEXT NOT NULL,
+                               grain TEXT NOT NULL,
+                               period TEXT NOT NULL,
+                               n INTEGER NOT NULL,
+                               total REAL,
+                               mean REAL,
+                               min REAL,
+                               max REAL,
+                               PRIMARY KEY (loc, param, grain, period))''')
+
+def _period_bounds(start, end, grain):
+    '''widen an epoch range [start, end] out to whole periods of `grain` (end exclusive)'''
+    first, last = pd.Timestamp(start, unit='s'), pd.Timestamp(end, unit='s')
+    if grain == 'day':
+        first, last = first.floor('D'), last.floor('D') + pd.Timedelta(days=1)
+    elif grain == 'month':
+        first, last = first.to_period('M').to_timestamp(), (last.to_period('M') + 1).to_timestamp()
+    else:
+        first, last = pd.Timestamp(year=first.year, month=1, day=1), pd.Timestamp(year=last.year + 1, month=1, day=1)
+    return _epoch(first), _epoch(last)
+
+def update_rollups(conn, loc, start=None, end=None):
+    '''
+    (Re)compute the daily/monthly/yearly count, sum, mean, min and max of every numeric weather parameter of
+    weather_<loc>, for the periods touching the epoch range [start, end] (all of it when not given), into
+    the weather_rollup table. Runs on the caller's open transaction (conn): one GROUP BY per grain over a
+    primary-key range, so keeping the rollups current as scrape blocks come in is cheap.
+    '''
+    _init_rollups(conn)
+    have = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("weather_{loc}")')}
+    params = [param for param in ROLLUP_PARAMS if param in have]
+    if not params:
+        return
+    if start is None or end is None:
+        start, end = conn.exec_driver_sql(f'SELECT MIN(time), MAX(time) FROM "weather_{loc}"').fetchone()
+        if start is None:
+            return
+    aggs = ', '.join(f'COUNT("{p}"), SUM("{p}"), AVG("{p}"), MIN("{p}"), MAX("{p}")' for p in params)
+    for grain, fmt in ROLLUP_GRAINS.items():
+        lo, hi = _period_bounds(start, end, grain)
+        rows = conn.exec_driver_sql(f'''SELECT strftime('{fmt}', time, 'unixepoch') AS period, {aggs}
+                                        FROM "weather_{loc}" WHERE time >= ? AND time < ?
+                                        GROUP BY period''', (lo, hi)).fetchall()
+        values = [(loc, param, grain, row[0]) + tuple(row[1 + 5*i:6 + 5*i])
+                  for row in rows for i, param in enumerate(params)]
+        if values:
+            conn.exec_driver_sql('''INSERT OR REPLACE INTO weather_rollup
+                                    (loc, param, grain, period, n, total, mean, min, max)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', values)
+
+def rollup(loc, param='temperature', grain='month', con=None):
+    '''
+    One location/parameter's rollup rows (period, n, total, mean, min, max) for a grain ('day', 'month',
+    'year'), built from the hourly table first if that location has no rollups yet. con defaults to
+    ScrapeDemo.db (pass engine for FinalProjectGMH.db).
+    '''
+    with (con or get_engine()).begin() as conn:
+        _init_rollups(conn)
+        if not conn.exec_driver_sql('SELECT 1 FROM weather_rollup WHERE loc = ? LIMIT 1', (loc,)).fetchone():
+            update_rollups(conn, loc)
+        return pd.read_sql('''SELECT period, n, total, mean, min, max FROM weather_rollup
+                              WHERE loc = ? AND param = ? AND grain = ? ORDER BY period''',
+                           con=conn, params=(loc, param, grain))
+
+def rollup_pivot(loc, param='temperature', stat='mean', con=None):
+    '''month x year table of a parameter's monthly `stat` (the heatmap input), straight from the rollups'''
+    monthly = rollup(loc, param, 'month', con)
+    monthly['year'] = monthly['period'].str[:4].astype(int)
+    monthly['month'] = monthly['period'].str[5:7].astype(int)
+    return monthly.pivot(index='month', columns='year', values=stat)
+
+def rollup_climatology(loc, param='temperature', con=None):
+    '''all-years mean, min and max of a parameter per calendar month, from the monthly rollups'''
+    monthly = rollup(loc, param, 'month', con)
+    monthly['month'] = monthly['period'].str[5:7].astype(int)
+    grouped = monthly.groupby('month')
+    return pd.DataFrame({'mean':grouped['total'].sum() / grouped['n'].sum(),
+                         'min':grouped['min'].min(),
+                         'max':grouped['max'].max()})
+
+#_________________________________________________________________________________________________________________
+def _store_block(loc, df_block, status, conn, pages=None, spans=None):
+    '''
+    write one finished block on an open transaction (conn): its hourly rows AND its ledger entries go in
+    together, so the ledger never claims a day that isn't actually in the table. pages ({day: script text}) go
+    into the raw archive in that same transaction too, and spans ({day: (first, last) epoch of its hours}) into
+    the ledger.
+    '''
+    spans = spans or {}
+    stamp = pd.Timestamp.now().isoformat(timespec='seconds')
+    _init_weather_table(conn, loc) #even if every day failed, so the location still has a (empty) table to read
+    if len(df_block):
+        _insert_weather(conn, loc, df_block)
+        update_rollups(conn, loc, int(df_block['time'].min()), int(df_block['time'].max()))
+    if pages:
+        _init_archive(conn)
+        conn.exec_driver_sql('''INSERT OR REPLACE INTO raw_pages (loc, day, codec, fetched, payload)
+                                VALUES (?, ?, ?, ?, ?)''',
+                             [(loc, day, RAW_CODEC, stamp, _compress(txt)) for day, txt in pages.items()])
+    conn.exec_driver_sql('''INSERT INTO scrape_ledger (loc, day, status, attempts, updated, first_time, last_time)
+                            VALUES (?, ?, ?, 1, ?, ?, ?)
+                            ON CONFLICT (loc, day) DO UPDATE SET status = excluded.status,
+                                                                attempts = attempts + 1,
+                                                                updated = excluded.updated,
+                                                                first_time = COALESCE(excluded.first_time, first_time),
+                                                                last_time = COALESCE(excluded.last_time, last_time)''',
+                         [(loc, day, st, stamp) + spans.get(day, (None, None)) for day, st in status.items()])
+
+def _pending_days(loc, days, resume):
+    '''the days from `days` this location still needs (i.e. not 'done' in its ledger)'''
+    with get_engine().begin() as conn:
+        _init_ledger(conn)
+        done = set()
+        if resume:
+            done = set(pd.read_sql("SELECT day FROM scrape_ledger WHERE loc = ? AND status = 'done'",
+                                   con=conn, params=(loc,))['day'])
+        if not done: #fresh start for this location... don't append on top of some older, un-ledgered table
+            table = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                         (f'weather_{loc}',)).fetchone()
+            if resume and table and conn.exec_driver_sql(f'SELECT 1 FROM "weather_{loc}" LIMIT 1').fetchone():
+                raise ValueError(f'"weather_{loc}" has rows but no ledger to resume from... keep them with '
+                                 f'migrate_weather_table("{loc}"), or pass resume=False to scrape it over from scratch')
+            _init_rollups(conn)
+            conn.exec_driver_sql(f'DROP VIEW IF EXISTS "weather_{loc}_text"')
+            conn.exec_driver_sql(f'DROP TABLE IF EXISTS "weather_{loc}"')
+            conn.exec_driver_sql('DELETE FROM scrape_ledger WHERE loc = ?', (loc,))
+            conn.exec_driver_sql('DELETE FROM weather_rollup WHERE loc = ?', (loc,))
+
+    todo = [day for day in days if day not in done]
+    if len(todo) < len(days):
+        print(f'resuming "{loc}": {len(days) - len(todo)} days already stored, {len(todo)} to go')
+    return todo
+
+#_________________________________________________________________________________________________________________
+PACIFIC_RING = ['Los Angeles', 'Manila', 'Darwin', 'Anchorage', 'Auckland'] #stations around the Pacific perimeter
+
+def weather_data(location={'USC':'34.0224,-118.2851'}, start='1950-01-01', end='2022-01-01', max_workers=8, rps=5.0,
+                 batch_days=30, resume=True, limiter=None, archive=False, metrics=None, profile=False):
+    '''
+    WARNING: RUNNING THIS FUNCTION WITH DEFAULT start & end ARGUMENTS TAKES HOURS (ROUGHLY 26,299 DAYS / rps SECONDS
+    PER LOCATION). IT SCRAPES A darksky.net URL FOR EVERY SINGLE DAY FROM start TO end AT EACH LOCATION IN THE
+    location DICT ({name: 'lat,lon'}, E.G. FROM coordinates()). EACH DAY IS 24 OBSERVATIONS (ON THE HOUR) OF 24
+    DIFFERENT WEATHER PARAMETERS.
+
+    IF YOU DON'T WANT YOUR COMPUTER TIED UP FOR HOURS, YOU'RE PROBABLY BETTER OFF JUST QUERYING THIS DATA FROM THE
+    SQL DATABASE 'FinalProjectGMH.db' PROVIDED IN THE ZIPPED FOLDER (WHICH IS WHAT THE ANALYSIS PART OF THE SCRIPT
+    DOES). EVERYTHING SCRAPED HERE GOES TO AN ENTIRELY DIFFERENT ScrapeDemo.db SQL DATABASE, SO AS NOT TO INTERFERE
+    WITH THE ANALYSIS TASKS.
+
+    HOW IT WORKS:
+    - FETCHING: PAGES ARE FETCHED CONCURRENTLY (max_workers AT A TIME, OVER POOLED KEEP-ALIVE CONNECTIONS) UNDER ONE
+      GLOBAL rps REQUESTS-PER-SECOND BUDGET THAT BACKS OFF WHENEVER DARKSKY TELLS US TO "COOL YOUR JETS". ALL THE
+      LOCATIONS' DAYS ARE INTERLEAVED UNDER THAT SAME RateLimiter (PASS limiter= TO SHARE IT WITH OTHER CALLS TOO).
+    - PARSING: EACH PAGE'S HOURLY PAYLOAD IS PARSED IN ONE PASS (darksky_parser) STRAIGHT INTO PREALLOCATED COLUMN
+      BUFFERS (darksky_parser.HourlyColumns).
+    - STORING: DAYS ARE SCRAPED IN BLOCKS OF batch_days. EACH FINISHED BLOCK IS COMMITTED TO THE LOCATION'S OWN
+      weather_<loc> TABLE IN ScrapeDemo.db (TYPED SCHEMA, SEE _init_weather_table) TOGETHER WITH ITS ROWS IN THE
+      scrape_ledger TABLE (ONE ROW PER loc/day: 'done' OR 'failed', PLUS THE HOUR RANGE STORED FOR IT) AND ITS
+      weather_rollup PERIODS. A LOCATION WHOSE DAYS ALL FAIL STILL GETS AN (EMPTY) TABLE.
+    - RESUMING: WITH resume=True (THE DEFAULT), RERUNNING FOR THE SAME LOCATION ONLY FETCHES THE DAYS THAT AREN'T
+      'done' YET, SO A CRASH OR THROTTLE AT HOUR 11 COSTS AT MOST ONE BLOCK. resume=False STARTS THE LOCATION OVER
+      FROM SCRATCH. A weather_<loc> TABLE WITH ROWS BUT NO LEDGER (AN OLD PANDAS-WRITTEN ONE) IS NEVER DROPPED ON A
+      RESUME: RUN migrate_weather_table() ON IT FIRST, OR PASS resume=False.
+    - ARCHIVING: WITH archive=True, EVERY FETCHED PAGE'S RAW SCRIPT TEXT IS ALSO KEPT (COMPRESSED) IN THE raw_pages
+      TABLE, SO reparse_archive() CAN REBUILD THOSE DAYS AFTER A PARSER FIX WITHOUT TOUCHING darksky.net AGAIN.
+    - PROGRESS: DAYS FETCHED/PARSED/STORED PER SECOND, HTTP LATENCY PERCENTILES, RETRIES, THROTTLES, BYTES AND AN
+      ETA ARE PRINTED AND APPENDED AS JSON LINES TO scrape_metrics.log EVERY 30 SECONDS (EVEN WHILE EVERY WORKER
+      IS SITTING OUT A BACKOFF), WITH A SUMMARY AT THE END. PASS YOUR OWN metrics.ScrapeMetrics AS metrics= TO
+      CHANGE THE LOG FILE OR INTERVAL; profile=True DUMPS cProfile STATS FOR THE fetch / parse / store STAGES.
+
+    RETURNS THE STORED TABLE (read_weather()) FOR THE LOCATION, OR A DICT OF {loc: stored table} WITH MORE THAN ONE.
+    SEE weather_data_batch() FOR THE PLACE-NAME VERSION.
+    '''
+    targets = {loc: latlon for loc, latlon in location.items() if latlon} #coordinates() gives None for duds
+    date_range = pd.date_range(start=start, end=end, freq='D')
+    days = [str(day)[:10] for day in date_range]#[:10] to exclude HH:MM:SS component
+
+    todo = {loc: _pending_days(loc, days, resume) for loc in targets}
+    #interleave the locations day by day, so every station makes progress under the same politeness budget
+    jobs = []
+    for i in range(max(map(len, todo.values()), default=0)):
+        for loc in targets:
+            if i < len(todo[loc]):
+                jobs.append((loc, todo[loc][i]))
+
+    metrics = metrics or ScrapeMetrics(', '.join(targets), profile=profile)
+    metrics.total_days = metrics.total_days or len(jobs)
+    limiter = limiter or RateLimiter(rps) #one politeness budget for the whole run
+    session = make_session(max_workers)
+    hourly = {loc: HourlyColumns(batch_days) for loc in targets} #columnar buffers, reused block after block
+    block_size = batch_days*max(1, len(targets))
+    for i in range(0, len(jobs), block_size):
+        block = [((loc, day), DARKSKY_URL.format(latlon=targets[loc], day=day)) for loc, day in jobs[i:i+block_size]]
+
+        with metrics.stage('fetch'):
+            fetched = list(fetch_pages(block, max_workers=max_workers, limiter=limiter, session=session,
+                                       metrics=metrics))
+
+        for buf in hourly.values():
+            buf.clear()
+        status = {loc: {} for loc in targets}
+        pages = {loc: {} for loc in targets}
+        spans = {loc: {} for loc in targets}
+        with metrics.stage('parse'):
+            for (loc, day), txt in fetched:
+                if txt is None:
+                    print(f'could not make dataTag for {loc} {day}')
+                    status[loc][day] = 'failed'
+                    continue
+                if archive:
+                    pages[loc][day] = txt
+                before = len(hourly[loc])
+                if hourly[loc].add_page(txt):
+                    status[loc][day] = 'done'
+                    spans[loc][day] = hourly[loc].span(before)
+                    metrics.count('parsed')
+                else:
+                    print(f'no hourly data for {loc} {day}')
+                    status[loc][day] = 'failed'
+
+        with metrics.stage('store'):
+            for loc in targets:
+                if status[loc]:
+                    with get_engine().begin() as conn:
+                        _store_block(loc, hourly[loc].frame(), status[loc], conn, pages[loc], spans[loc])
+                    done = sum(st == 'done' for st in status[loc].values())
+                    metrics.count('stored', done)
+                    metrics.count('failed', len(status[loc]) - done)
+        metrics.maybe_log()
+    session.close()
+    metrics.summary()
+
+    stored = {loc: read_weather(loc) for loc in targets}
+    return stored if len(stored) > 1 else next(iter(stored.values()), None)
+
+def weather_data_batch(places=PACIFIC_RING, start='1950-01-01', end='2022-01-01', **kwargs):
+    '''
+    Scrape several places in one go: resolves them all through coordinates(), then hands the lot to
+    weather_data() so their day-fetches share one scheduler and one rps budget. Each place still lands in its
+    own weather_<place> table (and its own ledger rows, so a rerun resumes every station). Extra keyword
+    args go straight to weather_data().
+    '''
+    return weather_data(coordinates(places), start=start, end=end, **kwargs)
+
 
-        if dataTag:
-            raw_days[day] = dataTag.text
+#_________________________________________________________________________________________________________________
+def _reparse_chunk(rows):
+    '''
+    worker for reparse_archive(): [(day, codec, payload), ...] -> (hourly data frame, {day: status},
+    {day: (first, last) epoch of that day's hours})
+    '''
+    hourly = HourlyColumns(len(rows))
+    status = {}
+    spans = {}
+    for day, codec, payload in rows:
+        before = len(hourly)
+        if hourly.add_page(_decompress(payload, codec)):
+            status[day] = 'done'
+            spans[day] = hourly.span(before)
         else:
-            print(f"dictionary value for key '{day}' entered as None Type")
-            raw_days[day] = None
-
-    #TURN RAW "DICT-LIKE" TEXT INTO ACTUAL DICTIONARY OF ALL DAYS' ACTUAL DATA
-    dict_days = dict.fromkeys(days)
-    for day, txt in raw_days.items():
-        hours = re.findall(r'(\{.*?\})',txt) #list type, containing dict-like elements: {..hour's text data..}
-        hourly_data = [] #will append actual hourly dictionaries to this list
-        for hour in hours[:24]: #leave out the last two - they're not hours... other stuff we don't want
-            data_list = hour.split(',') #split each {'dictionary'} on commas into its key-val pairs
-            keys = ['time',
-                'summary',
-                'icon',
-                'precipIntensity',
-                'precipProbability',
-                'precipType',
-                'temperature',
-                'apparentTemperature',
-                'dewPoint',
-                'humidity',
-                'pressure',
-                'windSpeed',
-                'windGust',
-                'windBearing',
-                'cloudCover',
-                'uvIndex',
-                'visibility',
-                'ozone',
-                'azimuth',
-                'altitude',
-                'dni',
-                'ghi',
-                'dhi',
-                'etr'
-               ]
-
-            intstr = r':(-*\d+)'       #regex to get integer values
-            fltstr = r':(-*\d+\.\d+)'  #regex to get float values
-
-            hour_dict = dict.fromkeys(keys)
-            for data in data_list:
-                for key in keys:
-                    if key in data:
-
-                        if re.search(fltstr, data):
-                            valflt = float(''.join(re.findall(fltstr, data)))
-                            hour_dict[key] = valflt
-
-                        elif re.search(intstr, data):
-                            valint = int(''.join(re.findall(intstr, data)))
-                            hour_dict[key] = valint
-
-                        else:
-                            valstr = str(''.join(re.findall(r':"(.*)"', data)))
-                            hour_dict[key] = valstr
-
-            hourly_data.append(hour_dict)
-
-        dict_days[day] = hourly_data #store the list of hourly dictionaries in this day's dictionary spot
-
-    #MELT FROM DICT OF HOURS INTO DICT OF "KEYS" I.E., WEATHER PARAMETERS (24-ELM LIST VARIABLE ABOVE)
-    melted_days = dict.fromkeys(days)
-    for day, hours in dict_days.items():
-        melted = dict.fromkeys(keys)
-        for k in keys:
-            for h in hours[:24]: #the last two are not hourly data
-                if melted[k]:#if already any entry for this weather parameter ("key"), append next hour's value
-                    melted[k].append(h[k])
-                else:#otherwise, this is the first entry for this parameter...
-                    melted[k] = [h[k]]
-        melted_days[day] = melted
-
-    #GATHER INTO DICTIONARY OF DATA FRAMES
-    dframes = dict.fromkeys(days)
-    for day, data in melted_days.items():
-        try:
-            dframes[day] = pd.DataFrame(data)
-        except IndexError:
-            print(f'cannot create dataframe for {day}')
-            dframes[day] = None
+            status[day] = 'failed'
+    return hourly.frame(), status, spans
 
-    #APPEND DATA FRAMES INTO ONE GIANT ONE ... THIS TAKES 3+ HOURS TO COMPLETE
-    df_list = list(dframes.values())
-    df_complete = df_list[0]
-    for i in range(len(df_list)-1):
-        try:
-            df_complete = df_complete.append(df_list[i+1])
-        except IndexError:
-            print(f'could not append dataframe {i+1}')
+def reparse_archive(loc, processes=None, chunk_days=365):
+    '''
+    Rebuild the archived days of the weather_<loc> table from the raw_pages archive alone (no network): the
+    archived pages are split into chunks of chunk_days, decompressed + parsed on `processes` worker processes
+    (all cores by default), and each archived day's stored hours (the first_time..last_time range its ledger
+    row recorded) are swapped for the freshly parsed ones, all in a single transaction with the ledger and
+    rollups updated to match. Days whose page doesn't parse any more keep their rows and ledger entry as they
+    are, and days scraped without archive=True have nothing to rebuild from, so they're left alone too.
+    '''
+    with get_engine().begin() as conn:
+        _init_archive(conn)
+        rows = conn.exec_driver_sql('SELECT day, codec, payload FROM raw_pages WHERE loc = ? ORDER BY day',
+                                    (loc,)).fetchall()
+    if not rows:
+        print(f'nothing archived for "{loc}"... scrape it with weather_data(..., archive=True) first')
+        return None
+    chunks = [[tuple(row) for row in rows[i:i+chunk_days]] for i in range(0, len(rows), chunk_days)]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_reparse_chunk, chunks))
 
-    #STORE THIS GIANT DF IN A SQL DB TABLE
-    df_complete.to_sql(f'weather_{list(location.keys())[0]}', con=demo_engine, if_exists='replace')
-    return df_complete
+    failed = 0
+    with get_engine().begin() as conn:
+        _init_ledger(conn)
+        _init_weather_table(conn, loc)
+        stored = {day: (first, last) for day, first, last in conn.exec_driver_sql(
+                      'SELECT day, first_time, last_time FROM scrape_ledger WHERE loc = ?', (loc,))}
+        for df_chunk, status, spans in results:
+            parsed = {day: st for day, st in status.items() if st == 'done'}
+            failed += len(status) - len(parsed)
+            #out with every hour the day was stored with, so hours the new parse no longer has don't linger...
+            #days stored before the ledger kept ranges only have the range of their new hours to go by
+            ranges = [stored[day] if stored.get(day, (None, None))[0] is not None else spans[day] for day in parsed]
+            if ranges:
+                conn.exec_driver_sql(f'DELETE FROM "weather_{loc}" WHERE time BETWEEN ? AND ?', ranges)
+            if parsed:
+                _store_block(loc, df_chunk, parsed, conn, spans=spans)
+    print(f'rebuilt {len(rows) - failed} archived days of "weather_{loc}"' +
+          (f' ({failed} no longer parse and were left as they were)' if failed else ''))
+    return read_weather(loc)
 
 
 #______________________________________________________________________________________________________________
-def solar_data():
+def _latest_time(table, con=None):
+    '''
+    latest stored `time` in a table as a Timestamp, or None if the table isn't there (or is empty) yet
+    '''
+    with (con or get_engine()).begin() as conn:
+        if not conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                    (table,)).fetchone():
+            return None
+        latest = conn.exec_driver_sql(f'SELECT MAX(time) FROM "{table}"').scalar()
+    return pd.to_datetime(latest) if latest is not None else None
+
+def _write_table(df, table, incremental=False, index=True, con=None):
+    '''
+    Store a driver data frame. Default: replace the whole table (inside one transaction, so readers never see
+    it missing or half written... get_engine()'s transactions cover the DROP/CREATE too). incremental=True:
+    upsert the rows into the existing table instead (INSERT OR REPLACE through a scratch table, all in one
+    transaction), adding any columns the table doesn't have yet. Either way the table ends up with a unique
+    index on `time`, which is what the upsert keys on. Pass the same `index` on both paths so full and
+    incremental writes leave the same columns (solar_cycle and ENSO are stored without the pandas `index`).
+    '''
+    with (con or get_engine()).begin() as conn:
+        exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                      (table,)).fetchone()
+        if not incremental or not exists:
+            df.to_sql(table, con=conn, if_exists='replace', index=index)
+        elif len(df):
+            scratch = f'_{table}_incoming'
+            df.to_sql(scratch, con=conn, if_exists='replace', index=index)
+            have = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+            cols = [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{scratch}")')]
+            for col in cols:
+                if col not in have:
+                    conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN "{col}"')
+            cols = ', '.join(f'"{col}"' for col in cols)
+            conn.exec_driver_sql(f'INSERT OR REPLACE INTO "{table}" ({cols}) SELECT {cols} FROM "{scratch}"')
+            conn.exec_driver_sql(f'DROP TABLE "{scratch}"')
+        conn.exec_driver_sql(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table}_time" ON "{table}" (time)')
+    print(f'{table}: {len(df)} rows {"upserted" if incremental and exists else "written"}')
+
+#______________________________________________________________________________________________________________
+SOLAR_URL = 'https://services.swpc.noaa.gov/json/solar-cycle/observed-solar-cycle-indices.json'
+SOI_URL = 'https://www.cpc.ncep.noaa.gov/data/indices/soi'
+
+def _get(url, metrics):
+    '''requests.get() that reports its latency and size to metrics'''
+    import requests
+    sent = time.perf_counter()
+    page = requests.get(url)
+    metrics.http(time.perf_counter() - sent, len(page.content))
+    metrics.count('fetched')
+    return page
+
+def solar_data(incremental=False, metrics=None):
     '''
     Scrape and parse json data. collect in dataframe. connect sqlalchemy engine and store
     dataframe as table in database
+
+    incremental=True only keeps the months newer than what solar_cycle already has and upserts those.
+    metrics (a metrics.ScrapeMetrics) gets the fetch / parse / store timings and the download size.
     '''
-    url = 'https://services.swpc.noaa.gov/json/solar-cycle/observed-solar-cycle-indices.json'
-    page = requests.get(url)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    solar_data = json.loads(soup.text)
-    df_solar = pd.DataFrame(solar_data)
-    df_solar.rename(columns={'time-tag':'time'}, inplace=True)
-    df_solar['time'] = pd.to_datetime(df_solar['time'])
-    df_solar.to_sql('solar_cycle', con=demo_engine, if_exists='replace')
+    from bs4 import BeautifulSoup
+    metrics = metrics or ScrapeMetrics('solar_cycle', log_path=None, quiet=True)
+    with metrics.stage('fetch'):
+        page = _get(SOLAR_URL, metrics)
+    with metrics.stage('parse'):
+        soup = BeautifulSoup(page.content, 'html.parser')
+        solar_data = json.loads(soup.text)
+        latest = _latest_time('solar_cycle') if incremental else None
+        if latest is not None:
+            solar_data = [rec for rec in solar_data if pd.Timestamp(rec['time-tag']) > latest]
+        df_solar = pd.DataFrame(solar_data, columns=None if solar_data else ['time-tag'])
+        df_solar.rename(columns={'time-tag':'time'}, inplace=True)
+        df_solar['time'] = pd.to_datetime(df_solar['time'])
+        metrics.count('parsed', len(df_solar))
+    with metrics.stage('store'):
+        _write_table(df_solar, 'solar_cycle', incremental, index=False)
+        metrics.count('stored', len(df_solar))
 #     return df_solar
 
 #_______________________________________________________________________________________________________________
-def ENSO_data():
+def _soi_rows(raw, after=None):
+    '''
+    (month-end timestamp, SOI) for every value in the first table of the cpc soi file that's newer than `after`.
+    rows run from the 'YEAR' header down until the first line that doesn't start with a year; -999.9 = missing
+    '''
+    rows = []
+    for line in raw[4:]:
+        fields = line.split()
+        if not fields or not (fields[0].isdigit() and len(fields[0]) == 4):
+            break
+        year = int(fields[0])
+        for month, element in enumerate(fields[1:13], start=1):
+            month_end = pd.Timestamp(year=year, month=month, day=1) + pd.offsets.MonthEnd(0)
+            if float(element) > -999 and (after is None or month_end > after):
+                rows.append((month_end, float(element)))
+    return rows
+
+def ENSO_data(incremental=False, metrics=None):
     '''
     Scrape ENSO data. save to SQL db.
+
+    incremental=True reads every year in the file (not just 1951-2021), keeps the months newer than what the
+    ENSO table already has and upserts those. metrics: same as solar_data().
     '''
-    url = 'https://www.cpc.ncep.noaa.gov/data/indices/soi'
-    page = requests.get(url)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    raw = soup.text.splitlines()
+    from bs4 import BeautifulSoup
+    metrics = metrics or ScrapeMetrics('ENSO', log_path=None, quiet=True)
+    with metrics.stage('fetch'):
+        page = _get(SOI_URL, metrics)
+    with metrics.stage('parse'):
+        soup = BeautifulSoup(page.content, 'html.parser')
+        raw = soup.text.splitlines()
 
-    start, end = 1951, 2022
-    ENSO = []
-    for line in raw[4:(end-start+4)]:
-        for element in line.split()[1:]:
-            ENSO.append(float(element))
+        latest = _latest_time('ENSO') if incremental else None
+        if incremental and latest is not None:
+            df_ENSO = pd.DataFrame(_soi_rows(raw, after=latest), columns=['time', 'SOI'])
+        else:
+            start, end = 1951, 2022
+            ENSO = []
+            for line in raw[4:(end-start+4)]:
+                for element in line.split()[1:]:
+                    ENSO.append(float(element))
 
-    months = pd.date_range(start='1951-01', end='2022-01', freq='M')
+            months = pd.date_range(start='1951-01', end='2022-01', freq=pd.offsets.MonthEnd())
 
-    df_ENSO = pd.DataFrame({'time':months, 'SOI':ENSO})
-    df_ENSO['time'] = pd.to_datetime(df_ENSO['time'])
-    df_ENSO.to_sql('ENSO', con=demo_engine, if_exists='replace')
+            df_ENSO = pd.DataFrame({'time':months, 'SOI':ENSO})
+            df_ENSO['time'] = pd.to_datetime(df_ENSO['time'])
+        metrics.count('parsed', len(df_ENSO))
+    with metrics.stage('store'):
+        _write_table(df_ENSO, 'ENSO', incremental, index=False)
+        metrics.count('stored', len(df_ENSO))
 #     return df_ENSO
 
 #________________________________________________________________________________________________________________
-def CO2emissions_data():
-    df_emissions = pd.read_csv('annual-co2-emissions-per-country.csv')
-    df_emissions.rename(columns={'Year':'time'}, inplace=True)
-    df_emissions['time'] = pd.to_datetime(df_emissions['time'], format='%Y')
-    df_emissions = df_emissions.pivot(index='time', columns='Entity', values='Annual CO2 emissions')
-    df_emissions.to_sql('CO2_emitted', con=demo_engine, if_exists='replace')
+def CO2emissions_data(incremental=False, metrics=None):
+    '''
+    incremental=True only keeps the years newer than what CO2_emitted already has and upserts those.
+    metrics: same as solar_data() (the csv read counts as the fetch).
+    '''
+    metrics = metrics or ScrapeMetrics('CO2_emitted', log_path=None, quiet=True)
+    with metrics.stage('fetch'):
+        df_emissions = pd.read_csv('annual-co2-emissions-per-country.csv')
+    with metrics.stage('parse'):
+        latest = _latest_time('CO2_emitted') if incremental else None
+        if latest is not None:
+            df_emissions = df_emissions[df_emissions['Year'] > latest.year]
+        df_emissions.rename(columns={'Year':'time'}, inplace=True)
+        df_emissions['time'] = pd.to_datetime(df_emissions['time'], format='%Y')
+        df_emissions = df_emissions.pivot(index='time', columns='Entity', values='Annual CO2 emissions')
+        metrics.count('parsed', len(df_emissions))
+    with metrics.stage('store'):
+        _write_table(df_emissions, 'CO2_emitted', incremental)
+        metrics.count('stored', len(df_emissions))
 #     return df_emissions
 
 #_________________________________________________________________________________________________________________
-def CO2ppm_data():
-    df_ppm = pd.read_csv('co2_mm_mlo.csv', skiprows=[x for x in range(51)])
-    time = pd.to_datetime(df_ppm.year.apply(str)+'-'+df_ppm.month.apply(str)).to_frame()
-    time.columns=['time']
-    df_ppm = df_ppm.merge(time, left_index=True, right_index=True)
-    df_ppm['time'] = pd.to_datetime(df_ppm['time'])
-    df_ppm.set_index('time', inplace=True)
-    df_ppm.to_sql('CO2_ppm', con=demo_engine, if_exists='replace')
+def CO2ppm_data(incremental=False, metrics=None):
+    '''
+    incremental=True only keeps the months newer than what CO2_ppm already has and upserts those.
+    metrics: same as CO2emissions_data().
+    '''
+    metrics = metrics or ScrapeMetrics('CO2_ppm', log_path=None, quiet=True)
+    with metrics.stage('fetch'):
+        df_ppm = pd.read_csv('co2_mm_mlo.csv', skiprows=[x for x in range(51)])
+    with metrics.stage('parse'):
+        latest = _latest_time('CO2_ppm') if incremental else None
+        if latest is not None:
+            df_ppm = df_ppm[df_ppm.year*12 + df_ppm.month > latest.year*12 + latest.month].reset_index(drop=True)
+        time = pd.to_datetime(df_ppm.year.astype(str)+'-'+df_ppm.month.astype(str)).to_frame()
+        time.columns=['time']
+        df_ppm = df_ppm.merge(time, left_index=True, right_index=True)
+        df_ppm['time'] = pd.to_datetime(df_ppm['time'])
+        df_ppm.set_index('time', inplace=True)
+        metrics.count('parsed', len(df_ppm))
+    with metrics.stage('store'):
+        _write_table(df_ppm, 'CO2_ppm', incremental)
+        metrics.count('stored', len(df_ppm))
 #     return df_ppm
 
 #Simple Moving (rolling) Average (SMA):_____________________________________________________________________________________
 def SMA(df,column,window_nobs,inplace=False,time_unit=None):
+    '''
+    window_nobs-YEAR simple moving average of df[column]. Frames with a DatetimeIndex (or a 'time' column) get
+    a time-based window (see rolling_stats.py), so it works on any frame regardless of its sampling rate or
+    gaps. time_unit ('hourly', 'daily', 'monthly', 'yearly') is only needed for frames with no time at all,
+    where the window falls back to a row count. The first window's worth is trimmed off, as before.
+
+    For several columns/windows (or anything you'll want again later) use rolling_stats.RollingStats directly.
+    '''
     valid_time_units = {"hourly":24*365, #number of hourly observations to make a 1-yr window
                         "daily":365, #... "..."
                         "monthly":12,
                         "yearly":1}
 
-    if df is df_LA or df is df_Manila:
-        unit = 24*365 #hourly data
-    elif df is df_ENSO or df is df_solar or df is df_CO2ppm:
-        unit = 12 #monthly data
-    elif df is df_CO2emitted:
-        unit = 1 #yearly data
+    if isinstance(df.index, pd.DatetimeIndex) or 'time' in df:
+        sma = RollingStats(df).get(column, years(window_nobs), trim=True) #indexed by time
+        if inplace==True and not isinstance(df.index, pd.DatetimeIndex): #line it back up with df's own rows
+            sma = sma.reindex(as_datetime(df['time'])).to_numpy()
+    elif time_unit in valid_time_units:
+        unit = valid_time_units[time_unit]
+        sma = df[column].rolling(unit*window_nobs, min_periods=1).mean()[unit*window_nobs:]
     else:
-        if time_unit in valid_time_units:
-#             unit = [x for x in time_unit.values()][0]
-            unit = valid_time_units[time_unit]
-        else:
-            print(f'non-standard data frame "{df}", *unit arg required, Nonetype returned.')
-            return None
+        print(f'non-standard data frame "{df}", *unit arg required, Nonetype returned.')
+        return None
 
     if inplace==True:
-        df[f'SMA_{window_nobs}_{column}'] = df[column].rolling(unit*window_nobs,min_periods=1).mean()[unit*window_nobs:]
+        df[f'SMA_{window_nobs}_{column}'] = sma
         return df
     else:
-        return df[column].rolling(unit*window_nobs, min_periods=1).mean()[unit*window_nobs:]
+        return sma
 
 #_________________________________________________________________________________________________________________
 def make_datetime(df_list):
     for df in df_list:
-        if df is df_LA or df is df_Manila:
-            df['time'] = pd.to_datetime(df['time'], unit='s') #unit='s' for 'numpy.float64' types
-        else:
-            df['time'] = pd.to_datetime(df['time']) #no additional argument for 'str' types
+        #unit='s' for the numeric (epoch) weather times, no additional argument for 'str' types... decided per
+        #column rather than by checking for the script's df_LA / df_Manila, so this works outside the script too
+        df['time'] = as_datetime(df['time'])
 
 #_________________________________________________________________________________________________________________
 def merge_dframes(df_list):
@@ -297,6 +951,290 @@ def merge_dframes(df_list):
 
     return dframes_merged
 
+#_________________________________________________________________________________________________________________
+GRID_FREQS = {'hourly':'h', 'daily':'D', 'monthly':'MS'}
+GRID_STEPS = {'hourly':pd.Timedelta(hours=1), 'daily':pd.Timedelta(days=1), 'monthly':pd.Timedelta(days=31)}
+
+#sampling interval -> the calendar period one observation of a coarse series stands for (longest first)
+COARSE_PERIODS = [(pd.Timedelta(days=360), 'Y'), (pd.Timedelta(days=28), 'M'), (pd.Timedelta(days=7), 'W'),
+                  (pd.Timedelta(days=1), 'D'), (pd.Timedelta(hours=1), 'h')]
+
+def _coarse_period(step):
+    '''the calendar period (pandas period alias) one observation of a series sampled every `step` covers'''
+    for length, period in COARSE_PERIODS:
+        if step >= length*0.95:
+            return period
+    return COARSE_PERIODS[-1][1]
+
+def _grid_start(ts, freq):
+    if freq == 'monthly':
+        return ts.to_period('M').to_timestamp()
+    return ts.floor(GRID_FREQS[freq])
+
+def align_frames(series, freq='daily', start=None, end=None):
+    '''
+    Put several time series with different sampling rates onto one common time grid ('hourly', 'daily' or
+    'monthly') - the compact replacement for merge_dframes()' outer-join chain, which padded everything out to
+    the union of all timestamps (mostly NaN) and mangled repeated column names into _x/_y.
+
+    series: {output column name: (data frame with a 'time' column, source column)}, e.g.
+            {'temp_LA': (df_LA, 'temperature'), 'SOI': (df_ENSO, 'SOI')}
+    'time' can be datetimes or unix epoch seconds. Series sampled at the grid rate or finer are averaged into
+    each grid step (resample().mean()); coarser ones (monthly SOI on a daily grid, yearly emissions...) are
+    matched by period: every grid step gets the value of the calendar period (month, year...) it falls in,
+    whether the source stamped that period at its start or its end (ENSO months come as month ends, solar /
+    CO2 ppm as month starts). Periods the series has no value for stay NaN.
+
+    Returns one dense frame indexed by 'time' on the grid (from start, or the earliest observation, to end, or
+    the latest), so its size scales with the grid, not with the inputs.
+    '''
+    prepared = {}
+    for name, (df, column) in series.items():
+        time = df['time']
+        time = pd.to_datetime(time, unit='s') if pd.api.types.is_numeric_dtype(time) else pd.to_datetime(time)
+        s = pd.Series(df[column].to_numpy(), index=pd.DatetimeIndex(time, name='time'), name=name)
+        prepared[name] = s[s.notna()].sort_index()
+
+    first = min(s.index[0] for s in prepared.values() if len(s))
+    last = max(s.index[-1] for s in prepared.values() if len(s))
+    grid = pd.date_range(_grid_start(pd.Timestamp(start) if start is not None else first, freq),
+                         pd.Timestamp(end) if end is not None else last,
+                         freq=GRID_FREQS[freq], name='time')
+
+    aligned = pd.DataFrame(index=grid)
+    for name, s in prepared.items():
+        step = s.index.to_series().diff().median() if len(s) > 1 else GRID_STEPS[freq]
+        if step <= GRID_STEPS[freq]*1.5: #same rate or finer: aggregate down to the grid
+            aligned[name] = s.resample(GRID_FREQS[freq]).mean().reindex(grid)
+        else: #coarser: each observation fills the grid steps of the period it covers, and only those
+            period = _coarse_period(step)
+            by_period = s.groupby(s.index.to_period(period)).mean()
+            aligned[name] = by_period.reindex(grid.to_period(period)).to_numpy()
+    return aligned
+
+#_________________________________________________________________________________________________________________
+def compact(df, skip=('time',)):
+    '''
+    Downcast a frame in place to the smallest dtypes that hold it: float32 for floats, the smallest int that
+    fits for ints, categoricals for text. Columns in `skip` are left alone (epoch `time` needs its width).
+    '''
+    for col in df.columns:
+        if col in skip:
+            continue
+        if pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype('float32')
+        elif pd.api.types.is_integer_dtype(df[col]) and not pd.api.types.is_extension_array_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype('category')
+    return df
+
+def _table_query(conn, table, columns, start, end, order):
+    '''
+    SELECT for read_table(): column projection, time range on whatever `time` is stored as (epoch numbers in
+    the weather tables, datetime text in the driver tables), plus the label maps for any dictionary-encoded
+    weather text columns in the projection
+    '''
+    decl = {row[1]: (row[2] or '').upper() for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+    if not decl:
+        raise ValueError(f'no table "{table}" in {conn.engine.url.database}')
+    columns = list(decl) if columns is None else list(columns)
+
+    where, params = [], []
+    if start is not None or end is not None:
+        kind = conn.exec_driver_sql(f'SELECT typeof(time) FROM "{table}" WHERE time IS NOT NULL LIMIT 1').scalar()
+        bound = _epoch if kind in ('integer', 'real') else (lambda when: str(pd.Timestamp(when)))
+        if start is not None:
+            where.append('time >= ?')
+            params.append(bound(start))
+        if end is not None:
+            where.append('time < ?')
+            params.append(bound(end))
+
+    select = ', '.join(f'"{col}"' for col in columns)
+    sql = f'SELECT {select} FROM "{table}"'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    if order:
+        sql += ' ORDER BY time'
+
+    labels = {}
+    if table.startswith('weather_'):
+        for field in WEATHER_TEXT_FIELDS:
+            if field in columns and decl.get(field) == 'INTEGER':
+                labels[field] = dict(conn.exec_driver_sql('SELECT id, label FROM weather_labels WHERE field = ?',
+                                                          (field,)).fetchall())
+    return sql, tuple(params), labels
+
+def _finish(df, labels, downcast):
+    for field, ids in labels.items():
+        df[field] = df[field].map(ids).astype('category')
+    return compact(df) if downcast else df
+
+def _iter_table(con, table, columns, start, end, order, chunksize, downcast):
+    with con.connect() as conn:
+        sql, params, labels = _table_query(conn, table, columns, start, end, order)
+        for chunk in pd.read_sql(sql, con=conn, params=params, chunksize=chunksize):
+            yield _finish(chunk, labels, downcast)
+
+def read_table(table, columns=None, start=None, end=None, con=None, chunksize=None, downcast=True, order=False):
+    '''
+    Reader for any table in FinalProjectGMH.db (the default con) or ScrapeDemo.db (con=demo_engine):
+        columns    only these columns (all of them by default)
+        start/end  only rows with start <= time < end, whether time is stored as epoch seconds or as text
+        chunksize  return an iterator of frames of that many rows instead of one frame
+        downcast   compact() every frame: float32 / small ints / categoricals (dictionary-encoded weather
+                   text columns come back decoded, as categoricals, either way)
+        order      ORDER BY time
+    '''
+    con = con or get_engine('engine')
+    if chunksize:
+        return _iter_table(con, table, columns, start, end, order, chunksize, downcast)
+    with con.connect() as conn:
+        sql, params, labels = _table_query(conn, table, columns, start, end, order)
+        return _finish(pd.read_sql(sql, con=conn, params=params), labels, downcast)
+
+def resample_chunked(table, column, freq='monthly', start=None, end=None, con=None, chunksize=250000):
+    '''
+    Mean of `column` per grid step ('hourly', 'daily', 'monthly' - same grids as align_frames()) computed
+    chunk by chunk: only one chunk plus the running per-step sums/counts are ever in memory, so the monthly
+    means (or the daily inputs to the correlations) of a 600k-row hourly table don't need the table loaded.
+    Returns a frame with 'time' and `column`, ready for align_frames().
+    '''
+    totals = None
+    for chunk in read_table(table, ['time', column], start, end, con, chunksize=chunksize, downcast=False):
+        times = as_datetime(chunk['time'])
+        if freq == 'monthly':
+            steps = times.dt.to_period('M').dt.to_timestamp()
+        else:
+            steps = times.dt.floor(GRID_FREQS[freq])
+        part = chunk[column].groupby(steps.to_numpy()).agg(['sum', 'count'])
+        totals = part if totals is None else totals.add(part, fill_value=0)
+
+    if totals is None:
+        return pd.DataFrame({'time':pd.to_datetime([]), column:[]})
+    totals = totals.sort_index()
+    return pd.DataFrame({'time':totals.index, column:(totals['sum'] / totals['count']).to_numpy()})
+
+#FIGURES___________________________________________________________________________________________________________
+def analysis_data(con=None):
+    '''
+    Everything the figures need, read from FinalProjectGMH.db (or con): the daily-aligned, 1950-on data frame
+    ('truncated'), its smoothed series ('smooth', a RollingStats), the month x year temperature pivots for LA and
+    Manila, and truncated joined with the smoothed series ('joined') for the correlation table.
+    '''
+    con = con or get_engine('engine')
+
+    #pull data (hourly temperatures as daily means, read chunk by chunk)
+    df_LA = resample_chunked('weather_Los Angeles', 'temperature', 'daily', con=con)
+    df_Manila = resample_chunked('weather_Manila', 'temperature', 'daily', con=con)
+    df_solar = read_table('solar_cycle', ['time', 'ssn', 'smoothed_ssn'], con=con)
+    df_ENSO = read_table('ENSO', ['time', 'SOI'], con=con)
+    df_CO2emitted = read_table('CO2_emitted', ['time', 'World'], con=con)
+    df_CO2ppm = read_table('CO2_ppm', ['time', 'interpolated'], con=con)
+
+    #clean, align onto a daily grid, truncate (Solar Data goes back way farther than all the others)
+    dframes = [df_LA, df_Manila, df_CO2emitted, df_CO2ppm, df_solar, df_ENSO]
+    make_datetime(dframes)
+    truncated = align_frames({'temp_LA':(df_LA, 'temperature'),
+                              'temp_Manila':(df_Manila, 'temperature'),
+                              'CO2_emissions':(df_CO2emitted, 'World'),
+                              'CO2_ppm':(df_CO2ppm, 'interpolated'),
+                              'ssn':(df_solar, 'ssn'),
+                              'smoothed_ssn':(df_solar, 'smoothed_ssn'),
+                              'SOI':(df_ENSO, 'SOI')},
+                             freq='daily', start='1950-01-01')
+
+    #month x year means come from the weather_rollup table, built once from the hourly rows
+    pvt_LA = rollup_pivot('Los Angeles', 'temperature', con=con).drop(columns=[2022], errors='ignore')
+    pvt_Manila = rollup_pivot('Manila', 'temperature', con=con).drop(columns=[1949,2022], errors='ignore').ffill()
+
+    #smoothed series are computed once here and shared by the stacked subplots and the correlations
+    smooth = RollingStats(truncated)
+    smooth.compute(['SOI'], [years(20)])
+    smooth.compute(['temp_LA', 'temp_Manila'], [years(2)])
+    smooth.compute(['ssn'], [years(12)])
+
+    return {'truncated':truncated, 'smooth':smooth, 'pvt_LA':pvt_LA, 'pvt_Manila':pvt_Manila,
+            'joined':truncated.join(smooth.frame(trim=True))}
+
+def heatmap_figure(pvt):
+    '''month x year heat map of a rollup_pivot()'''
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(16,6))
+    sns.heatmap(pvt, ax=fig.gca())
+    return fig
+
+def stacked_figure(truncated, smooth):
+    '''the six stacked subplots: CO2 emitted, CO2 ppm, SOI, LA and Manila temperatures, sunspots'''
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(6,1, figsize=(16,18), sharex=True)
+    axes[0].set_xlim(left=truncated.index[0], right=truncated.index[-1])
+    axes[0].plot(truncated.CO2_emissions.dropna(), label='CO2 tons')
+    axes[1].plot(truncated.CO2_ppm.dropna(), label='CO2 ppm')
+    axes[2].plot(truncated.SOI.dropna(), label='SOI anomaly')
+    axes[2].plot(smooth.get('SOI', years(20), trim=True), label='smoothed SOI')
+    axes[3].plot(smooth.get('temp_LA', years(2), trim=True), label='LA temp smoothed')
+    axes[4].plot(smooth.get('temp_Manila', years(2), trim=True), label='Manila temp smoothed')
+    axes[5].plot(truncated.ssn.dropna(), label='ssn')
+    axes[5].plot(smooth.get('ssn', years(12), trim=True), label='ssn smoothed')
+    for ax in axes:
+        ax.legend()
+        ax.grid()
+    return fig
+
+def correlation_figure(joined):
+    '''heat map of the correlation table'''
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(12,10))
+    sns.heatmap(joined.corr(), ax=fig.gca())
+    return fig
+
+#figure name -> (drawing function, the analysis_data() entries it takes)
+FIGURES = {'heatmap_LA':(heatmap_figure, ['pvt_LA']),
+           'heatmap_Manila':(heatmap_figure, ['pvt_Manila']),
+           'stacked':(stacked_figure, ['truncated', 'smooth']),
+           'correlation':(correlation_figure, ['joined'])}
+
+def show_figures(data=None):
+    '''draw every figure in interactive windows (plt.show()); returns the analysis_data() it used'''
+    import matplotlib.pyplot as plt
+    data = data or analysis_data()
+    for draw, keys in FIGURES.values():
+        draw(*[data[key] for key in keys])
+    plt.show()
+    return data
+
+def _render_figure(name, draw, args, outdir, formats):
+    '''worker process: draw one figure off screen and save it in every format'''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig = draw(*args)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(outdir, f'{name}.{fmt}')
+        fig.savefig(path, bbox_inches='tight')
+        paths.append(path)
+    plt.close(fig)
+    return paths
+
+def render_figures(outdir='figures', formats=('png',), processes=None, data=None):
+    '''
+    Headless version of show_figures(): the data is read once (analysis_data()), then every figure in FIGURES
+    is drawn and saved as outdir/<name>.<format> (png, svg, pdf...) by its own worker process (processes=None
+    means one per figure, capped at the cpu count). Returns the paths written.
+    '''
+    os.makedirs(outdir, exist_ok=True)
+    data = data or analysis_data()
+    processes = processes or min(len(FIGURES), os.cpu_count() or 1)
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_render_figure, name, draw, [data[key] for key in keys], outdir, tuple(formats))
+                   for name, (draw, keys) in FIGURES.items()]
+        return [path for future in futures for path in future.result()]
+
 #_________________________________________________________________________________________________________________
 #_________________________________________________________________________________________________________________
 ################################################ SCRIPT ##########################################################
@@ -323,93 +1261,71 @@ if __name__ == "__main__":
         CO2emissions_data()
         CO2ppm_data()
 
-        #2. pull data from FinalProjectGMH.db
-        df_LA = pd.read_sql(f"SELECT time, temperature FROM 'weather_Los Angeles'", con=engine)
-        df_Manila = pd.read_sql(f"SELECT time, temperature FROM weather_Manila", con=engine)
-        df_solar = pd.read_sql(f"SELECT time, ssn, smoothed_ssn FROM solar_cycle", con=engine)
-        df_ENSO = pd.read_sql(f"SELECT time, SOI FROM ENSO", con=engine)
-        df_CO2emitted = pd.read_sql(f"SELECT time, World FROM CO2_emitted", con=engine)
-        df_CO2ppm = pd.read_sql(f"SELECT time, interpolated FROM CO2_ppm", con=engine)
-
-        #3. clean, merge, truncate (Solar Data goes back way farther than all the others)
-        dframes = [df_LA, df_Manila, df_CO2emitted, df_CO2ppm, df_solar, df_ENSO]
-        make_datetime(dframes)
-        merged = merge_dframes(dframes)
-        merged.rename(columns={'temperature_x':'temp_LA',
-                       'temperature_y':'temp_Manila',
-                       'World':'CO2_emissions',
-                       'interpolated':'CO2_ppm'},
-                       inplace=True)
-        truncated = merged[merged['time'] >= pd.to_datetime('1950-01-01')].sort_values(by='time')
-        truncated.set_index('time', inplace=True)
-
-        #4. heat maps for temperature data
-        pvt_LA = df_LA.pivot_table(index=pd.to_datetime(df_LA['time'], unit='s').dt.month.rename('month'),
-                   columns=pd.to_datetime(df_LA['time'], unit='s').dt.year.rename('year'),
-                   values='temperature',
-                   aggfunc=np.mean)
-        pvt_Manila = df_Manila.pivot_table(index=pd.to_datetime(df_Manila['time'], unit='s').dt.month.rename('month'),
-                   columns=pd.to_datetime(df_Manila['time'], unit='s').dt.year.rename('year'),
-                   values='temperature',
-                   aggfunc=np.mean)
-        plt.figure(figsize=(16,6))
-        ax = sns.heatmap(pvt_LA.drop(columns=[2022.0]))
-        plt.figure(figsize=(16,6))
-        ax = sns.heatmap(pvt_Manila.drop(columns=[1949.0,2022.0]).fillna(method='ffill'))
-
-        #5. stacked subplots
-        fig, axes = plt.subplots(6,1, figsize=(16,18), sharex=True)
-        axes[0].set_xlim(left=truncated.index[0], right=truncated.index[-1])
-        axes[0].plot(truncated.CO2_emissions.dropna(), label='CO2 tons')
-        axes[0].legend()
-        axes[0].grid()
-        axes[1].plot(truncated.CO2_ppm.dropna(), label='CO2 ppm')
-        axes[1].legend()
-        axes[1].grid()
-        axes[2].plot(truncated.SOI.dropna(), label='SOI anomaly')
-        axes[2].plot(SMA(truncated, 'SOI', 20, time_unit='daily'), label='smoothed SOI')
-        axes[2].legend()
-        axes[2].grid()
-        axes[3].plot(SMA(truncated, 'temp_LA', 2, time_unit='hourly'), label='LA temp smoothed')
-        axes[3].legend()
-        axes[3].grid()
-        axes[4].plot(SMA(truncated, 'temp_Manila', 2, time_unit='hourly'), label='Manila temp smoothed')
-        axes[4].legend()
-        axes[4].grid()
-        axes[5].plot(truncated.ssn.dropna(), label='ssn')
-        axes[5].plot(SMA(truncated, 'ssn', 12, time_unit='daily'), label='ssn smoothed')
-        axes[5].legend()
-        axes[5].grid()
-        plt.show()
-
-        #6. correlation table with heatmap
-        SMA(truncated, 'SOI', 20, time_unit='daily', inplace=True)
-        SMA(truncated, 'temp_LA', 2, time_unit='hourly', inplace=True)
-        SMA(truncated, 'temp_Manila', 2, time_unit='hourly', inplace=True)
-        SMA(truncated, 'ssn', 12, time_unit='daily', inplace=True)
-        ax = sns.heatmap(truncated.corr())
-
-        print(f'Merged and Truncated Data Frame Head:\n')
-        print(truncated.head())
-
-    elif sys.argv[1] == '--scrape_loc': #'--scrape_loc: location' where location is a location name
+        #2.-6. pull data from FinalProjectGMH.db, clean/align it, draw the heat maps, stacked subplots and
+        #       correlation heat map (see analysis_data() and FIGURES above)
+        data = show_figures()
+        print(f'Aligned and Truncated Data Frame Head:\n')
+        print(data['joined'].head())
+
+    elif sys.argv[1] == '--analysis':
+        '''steps 2.-6. above without the scrape in 1.: straight to the figures, from FinalProjectGMH.db'''
+
+        data = show_figures()
+        print(f'Aligned and Truncated Data Frame Head:\n')
+        print(data['joined'].head())
+
+    elif sys.argv[1] == '--render': #'--render [folder] [format ...]', e.g. --render figures png svg
+        '''headless steps 2.-6. (no scrape, no windows... fine on a server or in cron): every figure is drawn by its
+        own worker process and saved to the folder (default: figures) in each format asked for (default: png).'''
+
+        outdir = sys.argv[2] if len(sys.argv) > 2 else 'figures'
+        for path in render_figures(outdir, sys.argv[3:] or ('png',)):
+            print(f'wrote {path}')
+
+    elif sys.argv[1] == '--scrape_loc': #'--scrape_loc: location [location ...]' where location is a location name
         '''if two arguments are present, use the second as the inpt to the coordinates() function, and
         scrape a truncated date range (1985-01-01 to 1985-01-10) of weather data at that location...
+        any further arguments are extra locations, all scraped together under one rate limit.
 
         A new table will be created in the ScrapeDemo.db containing this scraped data.'''
 
-        print(f'boop... beep... boop... processing location "{sys.argv[2]}" ...')
-        weather_data(coordinates(sys.argv[2]), start='1985-01-01', end='1985-01-10')
-        print(f'success! check folder for new table: "weather_{sys.argv[2]}" in ScrapeDemo.db')
+        places = sys.argv[2:]
+        print(f'boop... beep... boop... processing location(s) {places} ...')
+        weather_data_batch(places, start='1985-01-01', end='1985-01-10')
+        for place in places:
+            done = (scrape_progress(place)['status'] == 'done').sum()
+            if done:
+                print(f'success! check folder for new table: "weather_{place}" in ScrapeDemo.db ({done} days stored)')
+            else:
+                print(f'nothing stored for "{place}"... see the messages above')
 
     elif sys.argv[1] == '--super_huge_long_giant_weather_scrape': #--yeah, that's right... it's long for a reason
-        '''again, the second argument is the user's choice of location, but this time the full 72-year date
-        range is scraped.
+        '''again, the second argument is the user's choice of location (or several of them... or none, which means
+        the whole PACIFIC_RING), but this time the full 72-year date range is scraped.
 
         >>> BE WARNED: THIS WILL LIKELY TAKE AT LEAST 7 HOURS TO COMPLETE !!!!'''
 
         print('BE WARNED: THIS WILL LIKELY TAKE AT LEAST 7 HOURS TO COMPLETE !!!! ... good luck...')
-        weather_data(coordinates(sys.argv[2]))
+        print('(if it dies part way through, just rerun the same command: finished days are skipped)')
+        weather_data_batch(sys.argv[2:] or PACIFIC_RING, archive=True)
+
+    elif sys.argv[1] == '--update_drivers':
+        '''incremental refresh of the solar / ENSO / CO2 tables in ScrapeDemo.db: only records newer than what's
+        already stored get parsed and upserted.'''
+
+        metrics = ScrapeMetrics('drivers')
+        solar_data(incremental=True, metrics=metrics)
+        ENSO_data(incremental=True, metrics=metrics)
+        CO2emissions_data(incremental=True, metrics=metrics)
+        CO2ppm_data(incremental=True, metrics=metrics)
+        metrics.summary()
+
+    elif sys.argv[1] == '--reparse': #'--reparse location [location ...]'
+        '''rebuild the archived days of already-scraped location(s) from the raw page archive in ScrapeDemo.db...
+        no scraping involved, so it's just as fast as your cores can parse.'''
+
+        for place in sys.argv[2:]:
+            reparse_archive(place)
 
 else:
     print(f'... Importing module {__name__} ...')
\ No newline at end of file
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+'''
+Offline benchmark harness for Climate.py.
+
+Everything the pipeline normally pulls off the internet is served by StandIn, a local HTTP stand-in with
+configurable latency and its own rate limit (over the limit you get darksky's "cool your jets" page):
+
+    /details/<lat,lon>/<YYYY-MM-DD>/us12/en                     darksky day page
+    /geocode/v1/json?q=<place>                                  opencage geocoding JSON
+    /json/solar-cycle/observed-solar-cycle-indices.json         NOAA solar cycle JSON
+    /data/indices/soi                                           NOAA/CPC SOI text table
+
+Day pages are synthesized (darksky_parser.sample_page) unless a recorded page for that day exists in the
+--recordings folder as <YYYY-MM-DD>.html, in which case that's served instead.
+
+Each scale (10d, 1y, 72y days of hourly weather) times the weather_data() stages - fetch, parse, assemble
+(the old melt + DataFrame.append stages are now both columnar accumulation), store (SQL insert + rollups) -
+and weather_data() end to end, then the analysis path on a synthetic FinalProjectGMH-like database of that
+length - read, make_datetime, merge_dframes (the old outer-join chain), align_frames, SMA, RollingStats and
+the monthly x yearly pivot. Geocoding and the solar/SOI ingest are timed once. Results are appended to a
+JSON file (one record per scale/stage, tagged with the git revision) so runs can be compared across versions.
+
+    $ python bench.py                                   #10d and 1y
+    $ python bench.py --scales 10d 1y 72y --latency 0.05 --server_rps 200 --out bench_results.json
+'''
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+import darksky_parser
+
+SCALES = {'10d':10, '1y':365, '72y':26299}
+
+#_________________________________________________________________________________________________________________
+def _day_epoch(day):
+    return int(datetime.datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def darksky_page(day):
+    '''a whole synthetic details page: darksky keeps the hourly payload in the second <script> tag'''
+    return ('<html><head><script>window.dsk = {};</script></head><body>'
+            f'<script>{darksky_parser.sample_page(_day_epoch(day))}</script></body></html>')
+
+def solar_payload(start='1749-01', end='2022-01'):
+    months = pd.date_range(start, end, freq='MS')
+    rng = np.random.default_rng(0)
+    return json.dumps([{'time-tag':month.strftime('%Y-%m'), 'ssn':float(ssn), 'smoothed_ssn':float(ssn)*0.9,
+                        'observed_swpc_ssn':float(ssn), 'smoothed_swpc_ssn':-1.0, 'f10.7':70.0,
+                        'smoothed_f10.7':-1.0}
+                       for month, ssn in zip(months, rng.uniform(0, 250, len(months)))])
+
+def soi_payload(start=1951, end=2021):
+    rng = np.random.default_rng(1)
+    lines = ['SOUTHERN OSCILLATION INDEX', '', 'STANDARDIZED DATA',
+             'YEAR   JAN   FEB   MAR   APR   MAY   JUN   JUL   AUG   SEP   OCT   NOV   DEC']
+    for year in range(start, end + 1):
+        lines.append(f'{year}' + ''.join(f'{val:6.1f}' for val in rng.normal(0, 1, 12)))
+    return '\n'.join(lines + ['', '(ANOMALY) table follows...']) + '\n'
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type='text/html'):
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        stand_in.count('hits')
+        if stand_in.latency:
+            time.sleep(stand_in.latency)
+        if not stand_in.allow():
+            stand_in.count('throttled')
+            return self._send("<html>Cool your jets, buddy - that's quite enough server hits for you!</html>")
+
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts[0] == 'details':
+            day = parts[2]
+            if parts[1] in stand_in.dead_latlons:
+                return self._send('<html><script></script><script>var hours = [];</script></html>')
+            recorded = os.path.join(stand_in.recordings or '', f'{day}.html')
+            if stand_in.recordings and os.path.exists(recorded):
+                with open(recorded, encoding='utf-8') as f:
+                    return self._send(f.read())
+            return self._send(darksky_page(day))
+        if parts[0] == 'geocode':
+            place = parse_qs(url.query).get('q', [''])[0]
+            stand_in.count('geocode_hits')
+            if place in stand_in.unknown_places:
+                return self._send(json.dumps({'results':[]}), 'application/json')
+            lat, lon = (hash(place) % 18000)/100 - 90, (hash(place[::-1]) % 36000)/100 - 180
+            return self._send(json.dumps({'results':[{'geometry':{'lat':lat, 'lng':lon}}]}), 'application/json')
+        if parts[0] == 'json':
+            return self._send(stand_in.solar, 'application/json')
+        if parts[0] == 'data':
+            return self._send(stand_in.soi, 'text/plain')
+        self.send_error(404)
+
+class StandIn:
+    '''
+    Local stand-in for darksky / opencage / NOAA. latency (seconds) is added to every response; server_rps
+    (None = unlimited) is enforced with a token bucket, and requests over it get the throttle page. Places in
+    unknown_places get an empty geocoding answer; geocode_hits counts the geocoding requests on their own.
+    Details pages for the 'lat,lon' strings in dead_latlons come back without any hourly data.
+
+        with StandIn(latency=0.05, server_rps=100) as server:
+            Climate.DARKSKY_URL = server.darksky_url
+    '''
+    def __init__(self, latency=0.0, server_rps=None, recordings=None, unknown_places=(), dead_latlons=()):
+        self.latency = latency
+        self.server_rps = server_rps
+        self.recordings = recordings
+        self.unknown_places = set(unknown_places)
+        self.dead_latlons = set(dead_latlons)
+        self.hits = 0
+        self.geocode_hits = 0
+        self.throttled = 0
+        self.solar = solar_payload()
+        self.soi = soi_payload()
+        self._tokens = float(server_rps or 0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def count(self, counter):
+        '''bump one of the request counters (handlers run on many threads at once)'''
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def allow(self):
+        if not self.server_rps:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.server_rps, self._tokens + (now - self._last)*self.server_rps)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self.darksky_url = base + '/details/{latlon}/{day}/us12/en'
+        self.geocode_url = base + '/geocode/v1/json'
+        self.solar_url = base + '/json/solar-cycle/observed-solar-cycle-indices.json'
+        self.soi_url = base + '/data/indices/soi'
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+#_________________________________________________________________________________________________________________
+class Timer:
+    '''collects {scale, stage, seconds, rows} records'''
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, scale, stage, func, rows=None):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        n = rows(result) if callable(rows) else rows
+        self.records.append({'scale':scale, 'stage':stage, 'seconds':round(seconds, 6), 'rows':n})
+        print(f'{scale:>5} {stage:<24} {seconds:10.4f} s' + (f'  ({n} rows)' if n is not None else ''))
+        return result
+
+def bench_weather(Climate, timer, scale, n_days, max_workers, rps):
+    '''the weather_data() stages one by one, then the whole thing end to end'''
+    days = [str(day)[:10] for day in pd.date_range('1950-01-01', periods=n_days, freq='D')]
+    latlon = '34.0224,-118.2851'
+    jobs = [(day, Climate.DARKSKY_URL.format(latlon=latlon, day=day)) for day in days]
+    limiter = Climate.RateLimiter(rps, backoff=1.0)
+
+    pages = timer(scale, 'fetch', lambda: dict(Climate.fetch_pages(jobs, max_workers=max_workers, limiter=limiter)),
+                  rows=len)
+    parsed = timer(scale, 'parse', lambda: [darksky_parser.parse_hours(txt) for txt in pages.values()],
+                   rows=lambda hours: sum(map(len, hours)))
+
+    def assemble():
+        hourly = darksky_parser.HourlyColumns(n_days)
+        for hours in parsed:
+            hourly.add_hours(hours)
+        return hourly.frame()
+    df = timer(scale, 'assemble', assemble, rows=len)
+
+    def store():
+        with Climate.demo_engine.begin() as conn:
+            Climate._init_ledger(conn)
+            Climate._store_block(f'bench_{scale}', df, dict.fromkeys(days, 'done'), conn)
+    timer(scale, 'store', store, rows=len(df))
+
+    timer(scale, 'weather_data', lambda: Climate.weather_data({f'e2e_{scale}':latlon}, start=days[0], end=days[-1],
+                                                            max_workers=max_workers, rps=rps, resume=False),
+          rows=len)
+
+def make_analysis_db(path, n_days):
+    '''a FinalProjectGMH.db lookalike: two old-style hourly weather tables of n_days + the driver tables'''
+    analysis_engine = create_engine(f'sqlite:///{path}', echo=False)
+    rng = np.random.default_rng(2)
+    hours = pd.date_range('1950-01-01', periods=n_days*24, freq='h')
+    epoch = ((hours - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)).astype(float)
+    for loc in ['Los Angeles', 'Manila']:
+        temp = 60 + 10*np.sin(2*np.pi*hours.dayofyear/365) + rng.normal(0, 3, len(hours))
+        pd.DataFrame({'time':epoch, 'temperature':temp}).to_sql(f'weather_{loc}', analysis_engine, index=True)
+    months = pd.date_range('1749-01-01', '2022-01-01', freq='MS')
+    pd.DataFrame({'time':months, 'ssn':rng.uniform(0, 250, len(months)),
+                  'smoothed_ssn':rng.uniform(0, 250, len(months))}).to_sql('solar_cycle', analysis_engine)
+    month_ends = pd.date_range('1951-01-01', '2022-01-01', freq=pd.offsets.MonthEnd())
+    pd.DataFrame({'time':month_ends, 'SOI':rng.normal(0, 1, len(month_ends))}).to_sql('ENSO', analysis_engine)
+    years = pd.date_range('1750-01-01', '2021-01-01', freq='YS')
+    pd.DataFrame({'time':years, 'World':np.linspace(1e7, 3.5e10, len(years))}).set_index('time').to_sql(
+        'CO2_emitted', analysis_engine)
+    months = pd.date_range('1958-03-01', '2022-01-01', freq='MS')
+    pd.DataFrame({'time':months, 'interpolated':np.linspace(315, 416, len(months))}).set_index('time').to_sql(
+        'CO2_ppm', analysis_engine)
+    return analysis_engine
+
+def bench_analysis(Climate, timer, scale, n_days, workdir):
+    '''the analysis path of the script, old and new, on a synthetic db of n_days'''
+    analysis_engine = make_analysis_db(os.path.join(workdir, f'analysis_{scale}.db'), n_days)
+    frames = timer(scale, 'read_hourly', lambda: {loc: Climate.read_table(f'weather_{loc}', ['time', 'temperature'],
+                                                                          con=analysis_engine, downcast=False)
+                                                  for loc in ['Los Angeles', 'Manila']},
+                   rows=lambda res: sum(map(len, res.values())))
+    drivers = {table: Climate.read_table(table, ['time', column], con=analysis_engine, downcast=False)
+               for table, column in [('solar_cycle', 'ssn'), ('ENSO', 'SOI'), ('CO2_emitted', 'World'),
+                                     ('CO2_ppm', 'interpolated')]}
+
+    df_LA, df_Manila = frames['Los Angeles'], frames['Manila']
+    dframes = [df_LA, df_Manila, drivers['CO2_emitted'], drivers['CO2_ppm'], drivers['solar_cycle'], drivers['ENSO']]
+    timer(scale, 'make_datetime', lambda: Climate.make_datetime(dframes))
+    timer(scale, 'merge_dframes', lambda: Climate.merge_dframes(dframes), rows=len)
+    daily = timer(scale, 'read_daily_chunked', lambda: Climate.resample_chunked('weather_Los Angeles', 'temperature',
+                                                                               'daily', con=analysis_engine),
+                  rows=len)
+    aligned = timer(scale, 'align_frames', lambda: Climate.align_frames({'temp_LA':(daily, 'temperature'),
+                                                                         'temp_Manila':(df_Manila, 'temperature'),
+                                                                         'CO2_emissions':(drivers['CO2_emitted'], 'World'),
+                                                                         'CO2_ppm':(drivers['CO2_ppm'], 'interpolated'),
+                                                                         'ssn':(drivers['solar_cycle'], 'ssn'),
+                                                                         'SOI':(drivers['ENSO'], 'SOI')},
+                                                                        freq='daily', start='1950-01-01'),
+                    rows=len)
+    timer(scale, 'SMA', lambda: Climate.SMA(aligned, 'temp_LA', 2), rows=len)
+    def rolling():
+        stats = Climate.RollingStats(aligned)
+        stats.compute(['temp_LA', 'temp_Manila'], [Climate.years(2)], stats=('mean', 'std', 'anomaly'))
+        stats.compute(['SOI', 'ssn'], [Climate.years(12), Climate.years(20)])
+        return stats.frame()
+    timer(scale, 'RollingStats', rolling, rows=len)
+    timer(scale, 'pivot_hourly', lambda: df_LA.pivot_table(index=df_LA['time'].dt.month.rename('month'),
+                                                           columns=df_LA['time'].dt.year.rename('year'),
+                                                           values='temperature', aggfunc='mean'),
+          rows=lambda pvt: pvt.size)
+    timer(scale, 'rollup_build', lambda: Climate.rollup_pivot('Los Angeles', con=analysis_engine),
+          rows=lambda pvt: pvt.size)
+    timer(scale, 'rollup_pivot', lambda: Climate.rollup_pivot('Los Angeles', con=analysis_engine),
+          rows=lambda pvt: pvt.size)
+    analysis_engine.dispose()
+
+def _revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+#_________________________________________________________________________________________________________________
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='offline benchmarks for Climate.py')
+    parser.add_argument('--scales', nargs='+', default=['10d', '1y'], choices=list(SCALES))
+    parser.add_argument('--latency', type=float, default=0.02, help='stand-in latency per request (s)')
+    parser.add_argument('--server_rps', type=float, default=None, help='stand-in rate limit (default: none)')
+    parser.add_argument('--rps', type=float, default=100.0, help='client politeness budget (requests/s)')
+    parser.add_argument('--max_workers', type=int, default=16)
+    parser.add_argument('--recordings', default=None, help='folder of recorded darksky pages, <YYYY-MM-DD>.html')
+    parser.add_argument('--out', default='bench_results.json')
+    args = parser.parse_args(argv)
+    out = os.path.abspath(args.out)
+
+    workdir = tempfile.mkdtemp(prefix='climate_bench_')
+    here = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir) #Climate's ScrapeDemo.db (and everything else it writes) lands in the scratch folder
+    try:
+        import Climate
+        timer = Timer()
+        with StandIn(args.latency, args.server_rps, args.recordings) as server:
+            Climate.DARKSKY_URL = server.darksky_url
+            Climate.SOLAR_URL = server.solar_url
+            Climate.SOI_URL = server.soi_url
+            timer('-', 'coordinates', lambda: Climate.coordinates(Climate.PACIFIC_RING, refresh=True,
+                                                                  base_url=server.geocode_url), rows=len)
+            timer('-', 'coordinates_cached', lambda: Climate.coordinates(Climate.PACIFIC_RING,
+                                                                         base_url=server.geocode_url), rows=len)
+            timer('-', 'solar_data', Climate.solar_data)
+            timer('-', 'ENSO_data', Climate.ENSO_data)
+            for scale in args.scales:
+                bench_weather(Climate, timer, scale, SCALES[scale], args.max_workers, args.rps)
+                bench_analysis(Climate, timer, scale, SCALES[scale], workdir)
+            hits, throttled = server.hits, server.throttled
+    finally:
+        os.chdir(here)
+
+    run = {'revision':_revision(), 'when':datetime.datetime.now().isoformat(timespec='seconds'),
+           'python':sys.version.split()[0], 'pandas':pd.__version__, 'settings':vars(args),
+           'server_hits':hits, 'server_throttled':throttled, 'results':timer.records}
+    runs = []
+    if os.path.exists(out):
+        with open(out) as f:
+            runs = json.load(f)
+    runs.append(run)
+    with open(out, 'w') as f:
+        json.dump(runs, f, indent=1)
+    print(f'results appended to {out}')
+    return run
+
+
+if __name__ == "__main__":
+    main()
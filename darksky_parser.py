@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+'''
+Single-pass parser for the hourly weather payload darksky.net embeds in the second <script> tag of its
+/details/ pages. Each hour is a flat {"key":value,...} object; we find each one with a single precompiled
+pattern, read it once (as JSON, falling back to one precompiled key:value pattern if it isn't strict JSON)
+and cast every field to its proper type.
+
+The old parse stage in Climate.weather_data() split every hour on commas and then tried all 24 keys against
+every fragment with substring matching + up to three regex searches each, which was both slow (~45M regex
+calls for a full 72-year location) and wrong whenever one key name sits inside another ('temperature' in
+'apparentTemperature', 'precipIntensity'/'precipProbability' via 'precip...'). It's kept below as
+legacy_parse() purely so benchmark() has something to race against.
+
+    $ python darksky_parser.py      #run the microbenchmark
+'''
+import json
+import numpy as np
+import pandas as pd
+import re
+import sys
+import timeit
+
+WEATHER_KEYS = ['time',
+                'summary',
+                'icon',
+                'precipIntensity',
+                'precipProbability',
+                'precipType',
+                'temperature',
+                'apparentTemperature',
+                'dewPoint',
+                'humidity',
+                'pressure',
+                'windSpeed',
+                'windGust',
+                'windBearing',
+                'cloudCover',
+                'uvIndex',
+                'visibility',
+                'ozone',
+                'azimuth',
+                'altitude',
+                'dni',
+                'ghi',
+                'dhi',
+                'etr'
+               ]
+
+#type of every weather parameter... anything not listed here is a float
+FIELD_TYPES = dict.fromkeys(WEATHER_KEYS, float)
+FIELD_TYPES.update({'time':int, 'windBearing':int, 'uvIndex':int, 'summary':str, 'icon':str, 'precipType':str})
+
+_HOUR = re.compile(r'\{[^{}]*?"?time"?\s*:[^{}]*\}') #flat {...} objects that carry a time stamp = hours
+_PAIR = re.compile(r'"?(\w+)"?\s*:\s*("(?:[^"\\]|\\.)*"|[^,}]*)') #fallback: one key:value pair
+
+#_________________________________________________________________________________________________________________
+def _cast(key, val):
+    if val is None:
+        return None
+    kind = FIELD_TYPES[key]
+    try:
+        if kind is int: #through float first, so '270.0' (or 270.0) still comes out as 270
+            return int(float(val))
+        return kind(val)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def parse_hour(blob):
+    '''
+    One hour's {...} text -> dict with every key in WEATHER_KEYS (None where the page doesn't have it)
+    '''
+    try:
+        raw = json.loads(blob)
+    except ValueError: #not strict JSON (unquoted keys etc.)... read the pairs in one pass instead
+        raw = {}
+        for key, val in _PAIR.findall(blob):
+            if val.startswith('"'):
+                raw[key] = val[1:-1]
+            elif val.strip() not in ('', 'null', 'undefined'):
+                raw[key] = val.strip()
+    return {key: _cast(key, raw.get(key)) for key in WEATHER_KEYS}
+
+def parse_hours(txt, limit=24):
+    '''
+    One day's raw script text -> list of (at most `limit`) typed hourly dicts, in page order
+    '''
+    hours = []
+    if not txt:
+        return hours
+    for match in _HOUR.finditer(txt):
+        hours.append(parse_hour(match.group()))
+        if len(hours) == limit:
+            break
+    return hours
+
+#_________________________________________________________________________________________________________________
+class HourlyColumns:
+    '''
+    Columnar accumulator for parsed hours: one preallocated NumPy buffer per weather parameter (float64 for
+    the numbers, object for the three text fields), filled in place as pages come in and turned into a single
+    data frame at the end with frame(). Replaces the old dict-of-hours -> melted dict -> per-day DataFrame ->
+    DataFrame.append chain, so peak memory is about the size of the final table and assembly is one pass.
+
+    n_days sizes the buffers up front (24 rows per day); they double if more hours than that show up.
+    '''
+    def __init__(self, n_days, hours_per_day=24):
+        capacity = max(1, n_days*hours_per_day)
+        self.columns = {key: np.empty(capacity, dtype=object) if FIELD_TYPES[key] is str
+                             else np.full(capacity, np.nan)
+                        for key in WEATHER_KEYS}
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self, need):
+        capacity = len(self.columns['time'])
+        while capacity < need:
+            capacity *= 2
+        for key, buf in self.columns.items():
+            bigger = np.empty(capacity, dtype=object) if buf.dtype == object else np.full(capacity, np.nan)
+            bigger[:self.n] = buf[:self.n]
+            self.columns[key] = bigger
+
+    def add_hours(self, hours):
+        '''append a list of hourly dicts (as returned by parse_hours()); returns how many rows were added'''
+        if self.n + len(hours) > len(self.columns['time']):
+            self._grow(self.n + len(hours))
+        for i, hour in enumerate(hours, start=self.n):
+            for key, buf in self.columns.items():
+                val = hour[key]
+                if val is not None:
+                    buf[i] = val
+        self.n += len(hours)
+        return len(hours)
+
+    def span(self, start=0):
+        '''(first, last) epoch time of the rows from `start` on, e.g. of the page just added'''
+        times = self.columns['time'][start:self.n]
+        return int(np.nanmin(times)), int(np.nanmax(times))
+
+    def add_page(self, txt):
+        '''parse one day's raw script text straight into the buffers; returns how many hours it had'''
+        return self.add_hours(parse_hours(txt))
+
+    def frame(self):
+        '''everything accumulated so far as one data frame (int fields come out as nullable Int64)'''
+        data = {}
+        for key, buf in self.columns.items():
+            col = buf[:self.n]
+            if FIELD_TYPES[key] is int:
+                col = pd.array(col, dtype='Int64')
+            data[key] = col
+        return pd.DataFrame(data)
+
+    def clear(self):
+        '''reuse the same buffers for the next block'''
+        for key, buf in self.columns.items():
+            buf[:self.n] = None if buf.dtype == object else np.nan
+        self.n = 0
+
+#_________________________________________________________________________________________________________________
+def legacy_parse(txt):
+    '''
+    the original weather_data() parse stage, verbatim... only here for benchmark()
+    '''
+    keys = WEATHER_KEYS
+    hours = re.findall(r'(\{.*?\})',txt)
+    hourly_data = []
+    for hour in hours[:24]:
+        data_list = hour.split(',')
+        intstr = r':(-*\d+)'
+        fltstr = r':(-*\d+\.\d+)'
+        hour_dict = dict.fromkeys(keys)
+        for data in data_list:
+            for key in keys:
+                if key in data:
+                    if re.search(fltstr, data):
+                        hour_dict[key] = float(''.join(re.findall(fltstr, data)))
+                    elif re.search(intstr, data):
+                        hour_dict[key] = int(''.join(re.findall(intstr, data)))
+                    else:
+                        hour_dict[key] = str(''.join(re.findall(r':"(.*)"', data)))
+        hourly_data.append(hour_dict)
+    return hourly_data
+
+def sample_page(day_start=473385600):
+    '''
+    a synthetic script payload laid out like darksky's: 24 hourly objects followed by a couple of other
+    (non-hour) objects
+    '''
+    hours = []
+    for h in range(24):
+        hours.append('{"time":%d,"summary":"Partly Cloudy","icon":"partly-cloudy-night","precipIntensity":0.0012,'
+                     '"precipProbability":0.02,"precipType":"rain","temperature":%.2f,"apparentTemperature":%.2f,'
+                     '"dewPoint":41.37,"humidity":0.61,"pressure":1016.4,"windSpeed":3.96,"windGust":7.18,'
+                     '"windBearing":%d,"cloudCover":0.44,"uvIndex":%d,"visibility":10,"ozone":287.9,'
+                     '"azimuth":%.1f,"altitude":%.1f,"dni":0,"ghi":0,"dhi":0,"etr":0}'
+                     % (day_start + 3600*h, 50 + h*0.5, 49 + h*0.5, (h*15) % 360, max(0, 6 - abs(h - 12)),
+                        h*15.0, h*7.5 - 90))
+    return 'var hours = [%s], startHour = {"hour":0,"offset":-8}, units = {"temp":"F"};' % ','.join(hours)
+
+def benchmark(txt=None, number=200, days=26299):
+    '''
+    Time legacy_parse() vs parse_hours() on one day's payload (sample_page() by default). Returns per-day
+    seconds for each plus the extrapolated totals for `days` days (26,299 = one full 1950-2022 location).
+    '''
+    txt = txt or sample_page()
+    legacy = timeit.timeit(lambda: legacy_parse(txt), number=number) / number
+    single = timeit.timeit(lambda: parse_hours(txt), number=number) / number
+    return {'legacy_per_day': legacy,
+            'single_pass_per_day': single,
+            'speedup': legacy / single,
+            'legacy_full_location': legacy * days,
+            'single_pass_full_location': single * days}
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for name, val in benchmark(number=number).items():
+        print(f'{name:>26}: {val:.6f}')
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+'''
+Progress/throughput instrumentation for the long-running scrape and ingest functions in Climate.py.
+
+A ScrapeMetrics object is handed to weather_data() / fetch_pages() / the driver ingest functions, which feed
+it counters (days fetched, parsed, stored, failed), every HTTP response (latency + bytes), retries and
+throttles, and per-stage wall time. Every `interval` seconds it appends a JSON line with the running totals,
+rates, latency percentiles and an ETA to its log file (and prints a one-line progress report); summary()
+writes/prints the final numbers. With profile=True each stage also runs under cProfile, and the stats are
+dumped next to the log as <log>.<stage>.prof (view with `python -m pstats`). Code running on worker threads
+(the HTTP requests of the fetch stage) is profiled with profiled(), which gives every thread its own profiler;
+they're all merged into the stage's .prof file.
+
+    metrics = ScrapeMetrics('Manila', total_days=26299, log_path='scrape_metrics.log')
+    weather_data(..., metrics=metrics)
+'''
+import cProfile
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+COUNTERS = ('fetched', 'parsed', 'stored', 'failed', 'retries', 'throttles', 'bytes')
+
+class ScrapeMetrics:
+    '''
+    Thread-safe counters, latencies and stage timings for one scrape/ingest run.
+
+    name       label that goes on every log line
+    total_days how many days the run is expected to handle (for the ETA; can be set later)
+    log_path   JSON-lines log file to append to (None = don't log)
+    interval   seconds between periodic progress lines
+    profile    run each stage() under cProfile
+    quiet      don't print progress lines (the log file still gets them)
+    '''
+    def __init__(self, name='scrape', total_days=None, log_path='scrape_metrics.log', interval=30.0, profile=False,
+                 quiet=False):
+        self.name = name
+        self.total_days = total_days
+        self.log_path = log_path
+        self.interval = interval
+        self.profile = profile
+        self.quiet = quiet
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.latencies = []
+        self.stages = {}
+        self.profiles = {} #stage -> [cProfile.Profile, one per thread that ran it]
+        self._local = threading.local()
+        self.started = time.monotonic()
+        self._last_log = self.started
+        self._lock = threading.Lock()
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counts[counter] += n
+
+    def http(self, latency, nbytes):
+        '''one HTTP response: how long it took (s) and how big it was'''
+        with self._lock:
+            self.latencies.append(latency)
+            self.counts['bytes'] += nbytes
+
+    def _profiler(self, stage):
+        '''this thread's profiler for a stage (cProfile only sees the thread that enabled it)'''
+        mine = self._local.__dict__.setdefault('profilers', {})
+        if stage not in mine:
+            mine[stage] = cProfile.Profile()
+            with self._lock:
+                self.profiles.setdefault(stage, []).append(mine[stage])
+        return mine[stage]
+
+    @contextmanager
+    def profiled(self, stage):
+        '''run under cProfile as part of `stage` if profile=True (no timing)... from any thread'''
+        profiler = self._profiler(stage) if self.profile else None
+        if profiler:
+            try:
+                profiler.enable()
+            except ValueError: #python 3.12+ allows one active profiler per interpreter... the stage's covers it
+                profiler = None
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+
+    @contextmanager
+    def stage(self, stage):
+        '''time a stage (accumulated across calls), under cProfile too if profile=True'''
+        start = time.perf_counter()
+        try:
+            with self.profiled(stage):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def snapshot(self):
+        '''everything so far as a dict: totals, per-second rates, latency percentiles (ms), ETA (s)'''
+        with self._lock:
+            counts = dict(self.counts)
+            latencies = np.array(self.latencies)
+            stages = {stage: round(seconds, 3) for stage, seconds in self.stages.items()}
+        elapsed = time.monotonic() - self.started
+        done = counts['stored'] + counts['failed']
+        snap = {'name':self.name, 'elapsed':round(elapsed, 3), **counts,
+                'fetched_per_s':round(counts['fetched'] / elapsed, 3) if elapsed else None,
+                'parsed_per_s':round(counts['parsed'] / elapsed, 3) if elapsed else None,
+                'stored_per_s':round(counts['stored'] / elapsed, 3) if elapsed else None,
+                'stages':stages}
+        if len(latencies):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])*1000
+            snap.update({'latency_p50_ms':round(p50, 1), 'latency_p90_ms':round(p90, 1),
+                         'latency_p99_ms':round(p99, 1)})
+        if self.total_days:
+            snap['total_days'] = self.total_days
+            snap['eta_s'] = round((self.total_days - done)*elapsed / done, 1) if done else None
+        return snap
+
+    def _write(self, event, snap):
+        if self.log_path:
+            line = json.dumps({'ts':time.strftime('%Y-%m-%dT%H:%M:%S'), 'event':event, **snap})
+            with self._lock, open(self.log_path, 'a') as f:
+                f.write(line + '\n')
+
+    def maybe_log(self, force=False):
+        '''log (and print) a progress line if `interval` seconds have passed since the last one'''
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_log < self.interval:
+                return
+            self._last_log = now
+        snap = self.snapshot()
+        self._write('progress', snap)
+        if not self.quiet:
+            eta = snap.get('eta_s')
+            print(f"[{self.name}] {snap['stored']}/{self.total_days or '?'} days stored, {snap['failed']} failed, "
+                  f"{snap['fetched_per_s']} fetched/s, p50 {snap.get('latency_p50_ms', '-')} ms, "
+                  f"{snap['throttles']} throttles, ETA {'-' if eta is None else f'{eta/60:.1f} min'}")
+
+    def summary(self):
+        '''final numbers: written to the log, printed, returned; cProfile stats dumped per stage'''
+        snap = self.snapshot()
+        self._write('summary', snap)
+        for stage, profilers in self.profiles.items():
+            stats = [profiler for profiler in profilers if profiler.getstats()]
+            if stats:
+                pstats.Stats(*stats).dump_stats(f'{self.log_path or self.name}.{stage}.prof')
+        if not self.quiet:
+            print(f'[{self.name}] done in {snap["elapsed"]:.1f} s: ' +
+                  ', '.join(f'{counter} {snap[counter]}' for counter in COUNTERS) +
+                  (f", latency p50/p90/p99 {snap['latency_p50_ms']}/{snap['latency_p90_ms']}/"
+                   f"{snap['latency_p99_ms']} ms" if 'latency_p50_ms' in snap else '') +
+                  f", stage seconds {snap['stages']}")
+        return snap
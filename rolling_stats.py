@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+'''
+Time-aware rolling statistics for the time-indexed analysis frames (e.g. the align_frames() output in
+Climate.py).
+
+Windows are time offsets ('730D' = 2 years), not row counts, so they mean the same thing whatever the
+sampling rate of the frame is and however many gaps it has. Several columns are rolled together in one
+vectorized pass per window, and every (column, window, stat) result is memoized on the RollingStats object,
+so the plotting and correlation steps can share one set of smoothed series instead of recomputing them.
+
+    stats = RollingStats(truncated)
+    stats.compute(['temp_LA', 'temp_Manila'], ['730D'], stats=('mean', 'anomaly'))
+    stats.get('temp_LA', '730D')                #cached, no recompute
+    truncated.join(stats.frame())               #every cached series as columns, e.g. mean_730D_temp_LA
+'''
+import pandas as pd
+
+STATS = ('mean', 'std', 'anomaly')
+
+def as_datetime(times):
+    '''datetimes as-is, strings parsed, numbers taken as unix epoch seconds (like the weather tables' time)'''
+    if pd.api.types.is_numeric_dtype(times):
+        return pd.to_datetime(times, unit='s')
+    return pd.to_datetime(times)
+
+def years(n):
+    '''window offset string for n years (365-day years, same as the old SMA() row counts assumed)'''
+    return f'{int(round(365*n))}D'
+
+class RollingStats:
+    '''
+    Memoized multi-column, multi-window rolling statistics over one data frame with a DatetimeIndex (or a
+    'time' column, which becomes the index).
+
+    stats:  'mean'    - rolling mean
+            'std'     - rolling standard deviation
+            'anomaly' - rolling mean of the departure from climatology, i.e. from the all-years mean for that
+                        calendar month (see climatology())
+    min_periods is passed through to rolling().
+    '''
+    def __init__(self, df, min_periods=1):
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df = df.set_index(pd.DatetimeIndex(as_datetime(df['time']), name='time'))
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        self.df = df
+        self.min_periods = min_periods
+        self._cache = {}
+        self._climatology = {}
+
+    def climatology(self, column):
+        '''the all-years mean of `column` for each calendar month, broadcast back onto the frame's index'''
+        if column not in self._climatology:
+            col = self.df[column]
+            self._climatology[column] = col.groupby(col.index.month).transform('mean')
+        return self._climatology[column]
+
+    def compute(self, columns, windows, stats=('mean',)):
+        '''
+        Fill the cache for every (column, window, stat) combination that isn't there yet - each window does
+        one rolling pass over all the missing columns at once - and return them as a data frame.
+        '''
+        if isinstance(columns, str):
+            columns = [columns]
+        if isinstance(windows, str):
+            windows = [windows]
+        for stat in stats:
+            if stat not in STATS:
+                raise ValueError(f'unknown stat "{stat}", expected one of {STATS}')
+
+        for window in windows:
+            for stat in stats:
+                missing = [col for col in columns if (col, window, stat) not in self._cache]
+                if not missing:
+                    continue
+                if stat == 'anomaly':
+                    departures = pd.DataFrame({col: self.df[col] - self.climatology(col) for col in missing})
+                    rolled = departures.rolling(window, min_periods=self.min_periods).mean()
+                else:
+                    roll = self.df[missing].rolling(window, min_periods=self.min_periods)
+                    rolled = roll.mean() if stat == 'mean' else roll.std()
+                for col in missing:
+                    self._cache[(col, window, stat)] = rolled[col]
+
+        return pd.DataFrame({f'{stat}_{window}_{col}': self._cache[(col, window, stat)]
+                             for window in windows for stat in stats for col in columns})
+
+    def get(self, column, window, stat='mean', trim=False):
+        '''
+        One cached series (computed first if needed). trim=True drops the first `window` of it, where the
+        window isn't full yet - the old SMA() dropped those rows too.
+        '''
+        if (column, window, stat) not in self._cache:
+            self.compute([column], [window], stats=(stat,))
+        result = self._cache[(column, window, stat)]
+        if trim:
+            result = result[result.index >= result.index[0] + pd.Timedelta(window)]
+        return result
+
+    def frame(self, trim=False):
+        '''everything computed so far, one column per (stat, window, column)'''
+        return pd.DataFrame({f'{stat}_{window}_{col}': self.get(col, window, stat, trim)
+                             for col, window, stat in self._cache}, index=self.df.index)
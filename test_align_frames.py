@@ -0,0 +1,27 @@
+'''
+Tests for Climate.align_frames() with coarse (monthly / yearly) series on a daily grid.
+
+    $ python -m pytest test_align_frames.py
+'''
+import numpy as np
+import pandas as pd
+
+import Climate
+
+def months(stamps, drop=()):
+    df = pd.DataFrame({'time':stamps, 'value':np.arange(len(stamps), dtype=float)})
+    return df[~df['time'].dt.month.isin(drop)]
+
+def test_month_end_and_month_start_land_on_the_same_month():
+    aligned = Climate.align_frames({'end':(months(pd.date_range('1951-01-31', '1951-12-31', freq='ME')), 'value'),
+                                    'start':(months(pd.date_range('1951-01-01', '1951-12-01', freq='MS')), 'value')},
+                                   freq='daily', start='1951-01-01')
+    assert (aligned['end'] == aligned['start']).all()
+    assert (aligned.loc['1951-01', 'end'] == 0).all()
+    assert (aligned.loc['1951-02', 'end'] == 1).all()
+
+def test_missing_month_stays_missing():
+    soi = months(pd.date_range('1951-01-31', '1951-12-31', freq='ME'), drop=[2])
+    aligned = Climate.align_frames({'SOI':(soi, 'value')}, freq='daily', start='1951-01-01')
+    assert aligned.loc['1951-02', 'SOI'].isna().all()
+    assert aligned.loc['1951-03', 'SOI'].notna().all()
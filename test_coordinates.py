@@ -0,0 +1,65 @@
+'''
+Offline tests for Climate.coordinates() and its geocode_cache, against bench.StandIn's local geocoding endpoint.
+
+    $ python -m pytest test_coordinates.py
+'''
+import pytest
+
+import bench
+import Climate
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    '''a fresh ScrapeDemo.db in a scratch folder, and a stand-in geocoder that doesn't know "Atlantis"'''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Climate, '_engines', {})
+    with bench.StandIn(unknown_places=['Atlantis']) as stand_in:
+        yield stand_in
+    for engine in Climate._engines.values():
+        engine.dispose()
+
+def lookup(server, places, **kwargs):
+    return Climate.coordinates(places, base_url=server.geocode_url, **kwargs)
+
+def cached_keys():
+    with Climate.get_engine().begin() as conn:
+        return {row[0] for row in conn.exec_driver_sql('SELECT key FROM geocode_cache')}
+
+def test_cache_hit(server):
+    first = lookup(server, ['Manila', 'Darwin'])
+    assert server.geocode_hits == 2
+    assert lookup(server, ['manila ', 'Darwin']) == {'manila ':first['Manila'], 'Darwin':first['Darwin']}
+    assert server.geocode_hits == 2
+
+def test_duplicates_are_one_lookup(server):
+    latlon = lookup(server, ['LA', 'la', ' La'])
+    assert server.geocode_hits == 1
+    assert len(set(latlon.values())) == 1
+    assert cached_keys() == {'la'}
+
+def test_refresh_skips_cache(server):
+    lookup(server, 'Manila')
+    lookup(server, 'Manila', refresh=True)
+    assert server.geocode_hits == 2
+
+def test_ttl_expiry(server):
+    lookup(server, 'Manila')
+    with Climate.get_engine().begin() as conn:
+        conn.exec_driver_sql('UPDATE geocode_cache SET fetched = fetched - 10*86400')
+    lookup(server, 'Manila', ttl_days=30)
+    assert server.geocode_hits == 1
+    lookup(server, 'Manila', ttl_days=5)
+    assert server.geocode_hits == 2
+
+def test_max_entries_evicts_oldest(server):
+    for place in ['Manila', 'Darwin', 'Auckland']:
+        lookup(server, place, max_entries=2)
+    assert cached_keys() == {'darwin', 'auckland'}
+    lookup(server, 'Manila', max_entries=2)
+    assert server.geocode_hits == 4
+
+def test_failures_not_cached(server):
+    assert lookup(server, ['Atlantis', 'Manila'])['Atlantis'] is None
+    assert cached_keys() == {'manila'}
+    lookup(server, ['Atlantis', 'Manila'])
+    assert server.geocode_hits == 3
@@ -0,0 +1,84 @@
+'''
+Offline tests for Climate.weather_data() and the tables it keeps, against bench.StandIn's local darksky pages.
+
+    $ python -m pytest test_weather_data.py
+'''
+import pandas as pd
+import pytest
+
+import bench
+import darksky_parser
+import Climate
+
+GOOD, DEAD = '34.0500,-118.2400', '12.4600,130.8400'
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    '''a fresh ScrapeDemo.db in a scratch folder, and stand-in darksky pages (none with data for DEAD)'''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Climate, '_engines', {})
+    with bench.StandIn(dead_latlons=[DEAD]) as stand_in:
+        monkeypatch.setattr(Climate, 'DARKSKY_URL', stand_in.darksky_url)
+        yield stand_in
+    for engine in Climate._engines.values():
+        engine.dispose()
+
+def scrape(location, start='2020-01-01', end='2020-01-03', **kwargs):
+    return Climate.weather_data(location, start=start, end=end, rps=100.0, **kwargs)
+
+def test_every_day_failing(server):
+    stored = scrape({'LA':GOOD, 'Darwin':DEAD})
+    assert len(stored['LA']) == 72
+    assert len(stored['Darwin']) == 0
+    assert set(Climate.scrape_progress('Darwin')['status']) == {'failed'}
+    hits = server.hits
+    assert len(scrape({'Darwin':DEAD})) == 0 #on its own too, and the failed days get asked for again
+    assert server.hits - hits == 3
+
+def archive_page(loc, day, txt):
+    with Climate.get_engine().begin() as conn:
+        conn.exec_driver_sql('UPDATE raw_pages SET codec = ?, payload = ? WHERE loc = ? AND day = ?',
+                             (Climate.RAW_CODEC, Climate._compress(txt), loc, day))
+
+def test_reparse_drops_hours_the_new_parse_lacks(server):
+    scrape({'LA':GOOD}, end='2020-01-05', archive=True)
+    txt = Climate.raw_page('LA', '2020-01-03')
+    hours = list(darksky_parser._HOUR.finditer(txt))
+    archive_page('LA', '2020-01-03', txt[:hours[-2].end()] + txt[hours[-1].end():]) #last hour cut off
+
+    assert len(Climate.reparse_archive('LA', processes=1)) == 5*24 - 1
+    ledger = Climate.scrape_progress('LA').set_index('day')
+    assert set(ledger['status']) == {'done'}
+
+def test_reparse_leaves_days_that_no_longer_parse(server):
+    scrape({'LA':GOOD}, end='2020-01-05', archive=True)
+    before = Climate.scrape_progress('LA').set_index('day')
+    archive_page('LA', '2020-01-03', 'var hours = [];')
+
+    assert len(Climate.reparse_archive('LA', processes=1)) == 5*24
+    after = Climate.scrape_progress('LA').set_index('day')
+    assert after.loc['2020-01-03', 'status'] == 'done'
+    assert after.loc['2020-01-03', 'attempts'] == before.loc['2020-01-03', 'attempts']
+
+def old_table(loc, days):
+    '''a weather_<loc> table the way the old pandas-based weather_data() wrote it'''
+    pages = [darksky_parser.sample_page(bench._day_epoch(day)) for day in days]
+    hours = [hour for page in pages for hour in darksky_parser.parse_hours(page)]
+    pd.DataFrame(hours).to_sql(f'weather_{loc}', Climate.get_engine(), if_exists='replace')
+
+def test_resume_after_migration(server):
+    old_table('LA', ['2020-01-01', '2020-01-02'])
+    Climate.migrate_weather_table('LA')
+    assert list(Climate.scrape_progress('LA')['day']) == ['2020-01-01', '2020-01-02']
+    assert len(Climate.rollup('LA', grain='day')) == 2
+
+    hits = server.hits
+    assert len(scrape({'LA':GOOD}, end='2020-01-04')) == 4*24
+    assert server.hits - hits == 2
+
+def test_unledgered_table_is_not_dropped(server):
+    old_table('LA', ['2020-01-01'])
+    with pytest.raises(ValueError):
+        scrape({'LA':GOOD})
+    assert len(pd.read_sql('SELECT * FROM "weather_LA"', Climate.get_engine())) == 24
+    assert len(scrape({'LA':GOOD}, resume=False)) == 3*24